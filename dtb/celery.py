@@ -18,9 +18,9 @@ app.autodiscover_tasks()
 app.conf.enable_utc = False
 
 app.conf.beat_schedule = {
-    'check-nodes-every-5-minutes': {
+    'check-due-nodes-every-minute': {
         'task': 'nodes.tasks.check_nodes_task',
-        'schedule': crontab(minute='*/5'),
+        'schedule': crontab(minute='*'),
     },
     'send-nodes-at-9-00': {
         'task': 'nodes.tasks.send_nodes_status_task',
@@ -1,3 +1,4 @@
+import json
 import logging
 import os
 import sys
@@ -149,6 +150,10 @@ CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
 CELERY_TIMEZONE = TIME_ZONE
 CELERY_TASK_DEFAULT_QUEUE = 'default'
+CELERY_NODE_CHECKS_QUEUE = os.getenv('CELERY_NODE_CHECKS_QUEUE', 'node_checks')
+CELERY_TASK_ROUTES = {
+    'nodes.tasks.check_targets_task': {'queue': CELERY_NODE_CHECKS_QUEUE},
+}
 
 
 # -----> TELEGRAM
@@ -184,3 +189,44 @@ TELEGRAM_LOGS_CHAT_ID = os.getenv("TELEGRAM_LOGS_CHAT_ID", default=None)
 
 WRONG_STATUS_COUNT_ALERT = 3
 GOOD_STATUS_COUNT_ALERT = 1
+
+# -----> NODES CHECKS
+SSH_CHECKS_CONCURRENCY = int(os.getenv("SSH_CHECKS_CONCURRENCY", default=200))
+TCP_PROBE_TIMEOUT = float(os.getenv("TCP_PROBE_TIMEOUT", default=3))
+SSH_KEYS_DIR = os.getenv("SSH_KEYS_DIR", default=None)  # per user default keys, file name is telegram user_id
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", default=5))
+HTTP_READ_TIMEOUT = float(os.getenv("HTTP_READ_TIMEOUT", default=15))
+HTTP_RETRIES = int(os.getenv("HTTP_RETRIES", default=2))
+HTTP_RETRY_BACKOFF = float(os.getenv("HTTP_RETRY_BACKOFF", default=0.3))
+HTTP_POOL_HOSTS = int(os.getenv("HTTP_POOL_HOSTS", default=100))
+HTTP_POOL_PER_HOST = int(os.getenv("HTTP_POOL_PER_HOST", default=10))
+HTTP_CHECKS_CONCURRENCY = int(os.getenv("HTTP_CHECKS_CONCURRENCY", default=100))
+HTTP_CHECKS_PER_HOST = int(os.getenv("HTTP_CHECKS_PER_HOST", default=4))
+REFERENCE_DATA_TTL = int(os.getenv("REFERENCE_DATA_TTL", default=60))  # explorer heights and wallet balances
+REFERENCE_DATA_LOCAL_TTL = int(os.getenv("REFERENCE_DATA_LOCAL_TTL", default=10))
+REFERENCE_HEDGE_DELAY = float(os.getenv("REFERENCE_HEDGE_DELAY", default=1))
+REFERENCE_SOURCE_TIMEOUT = float(os.getenv("REFERENCE_SOURCE_TIMEOUT", default=5))
+# Reference height sources per chain, explorers.guru blocks api or tendermint rpc /status urls
+CHAIN_HEIGHT_SOURCES = {
+    'defund': ['https://defund.api.explorers.guru/api/v1/blocks?limit=1'],
+    'nibiru': ['https://nibiru.api.explorers.guru/api/v1/blocks?limit=1'],
+    'lava': ['https://lava.api.explorers.guru/api/v1/blocks?limit=1'],
+}
+for chain, sources in json.loads(os.getenv("CHAIN_HEIGHT_SOURCES", default='{}')).items():
+    CHAIN_HEIGHT_SOURCES[chain] = CHAIN_HEIGHT_SOURCES.get(chain, []) + sources
+ADAPTIVE_TIMEOUT_FACTOR = float(os.getenv("ADAPTIVE_TIMEOUT_FACTOR", default=2))  # timeout is p99 latency times factor
+ADAPTIVE_MIN_TIMEOUT = float(os.getenv("ADAPTIVE_MIN_TIMEOUT", default=3))
+# Breaker and latency state live in each worker process, with prefork every process counts failures on its own
+BREAKER_FAILURES = int(os.getenv("BREAKER_FAILURES", default=3))
+BREAKER_BACKOFF = float(os.getenv("BREAKER_BACKOFF", default=300))
+BREAKER_MAX_BACKOFF = float(os.getenv("BREAKER_MAX_BACKOFF", default=6 * 60 * 60))
+TARGET_RESULT_TTL = int(os.getenv("TARGET_RESULT_TTL", default=30))  # same endpoint of several users is checked once
+# Applied target results may be this old, older ones are checked again
+CHECK_RESULT_MAX_AGE = int(os.getenv("CHECK_RESULT_MAX_AGE", default=10 * 60))
+CHECK_NOW_WORKERS = int(os.getenv("CHECK_NOW_WORKERS", default=32))  # check threads of one /now call
+CHECK_NOW_DEADLINE = float(os.getenv("CHECK_NOW_DEADLINE", default=60))  # seconds, slower checks are reported down
+CHECK_INTERVAL = int(os.getenv("CHECK_INTERVAL", default=5 * 60))  # seconds, for node types without a schedule row
+CHECK_INTERVAL_MIN = int(os.getenv("CHECK_INTERVAL_MIN", default=60))  # while status changes or is not alerted yet
+CHECK_INTERVAL_MAX = int(os.getenv("CHECK_INTERVAL_MAX", default=30 * 60))  # longest backoff of healthy nodes
+CHECK_BACKOFF_CHECKS = int(os.getenv("CHECK_BACKOFF_CHECKS", default=12))  # same good checks to double the interval
+CHECK_JITTER = float(os.getenv("CHECK_JITTER", default=5))  # seconds around the node check time slot
@@ -0,0 +1,155 @@
+"""
+    Microbenchmark of ssh answer tokenizing on recorded outputs of every ssh checker type.
+
+    Run with: python -m nodes.benchmark
+"""
+import re
+from timeit import timeit
+
+from nodes.ssh_logic import TerminalTokenizer
+
+REPEAT = 2000
+
+GREEN = '\x1b[32m'
+RESET = '\x1b[0m'
+PROMPT = '\x1b]0;root@node: ~\x07\x1b[01;32mroot@node\x1b[00m:\x1b[01;34m~\x1b[00m# '
+
+RECORDED_ANSWERS = {
+    'massa': (
+        'Wallet info:\r\n'
+        'Address: A12kRXeN5fWmXpAqYyNuqD9pWcDfJjb4dE5Ko3pEHJZqX6sRmbm (thread 7):\r\n'
+        '\tBalance: final=10.2134, candidate=10.2134\r\n'
+        '\tRolls: active=1, final=1, candidate=1\r\n'
+        '\tLocked coins:0\r\n'
+    ),
+    'starknet': (
+        PROMPT + 'systemctl status starknetd | grep Active\r\n'
+        f'     Active: {GREEN}active (running){RESET} since Mon 2022-09-05 10:12:01 UTC; 3 weeks 2 days ago\r\n'
+        + PROMPT
+    ),
+    'aleo': (
+        PROMPT + 'systemctl status 1to-miner | grep Active\r\n'
+        f'     Active: {GREEN}active (running){RESET} since Tue 2022-09-13 08:00:11 UTC; 1 week 6 days ago\r\n'
+        + PROMPT
+    ),
+    'shardeum': (
+        PROMPT + '/root/.shardeum/shell.sh\r\n'
+        'root@shardeum-dashboard:/home/node/app/cli# operator-cli status\r\n'
+        'state: active\r\n'
+        'totalTimeValidating: 1321233\r\n'
+        'lastActive: Fri, 30 Sep 2022 12:13:11 GMT\r\n'
+        'stakeRequirement: "10.0"\r\n'
+        'nominatorAddress: "0x3a21dd8a2c3a1b2ddff2f5c7b0d7a0a1c9a9e2f1"\r\n'
+        'nomineeAddress: "0x9b1e1fe8a1bd3e7e1c0f5c9d1be7b62f90a2ce1d"\r\n'
+        'lockedStake: "10.0"\r\n'
+        'currentRewards: "33.12"\r\n'
+    ),
+    'ironfish': (
+        'Version              0.1.48 @ 4f12c3a\r\n'
+        'Node                 \x1b[32mSTARTED\x1b[39m\r\n'
+        'Node Name            tomatto\r\n'
+        'Block Graffiti       tomatto\r\n'
+        'Memory               Heap: 563.21 MiB -> 1.02 GiB / 3.88 GiB (14.2%), RSS: 1.73 GiB (22.1%), Free: 5.2 GiB\r\n'
+        'CPU                  Cores: 4, Current: 10.2%\r\n'
+        'P2P Network          Connected, Nodes: 50 / 50\r\n'
+        'Mining               POOL STOPPED - 0 miners, 0 mined\r\n'
+        'Mem Pool             Count: 12 tx, Bytes: 42.4 KiB\r\n'
+        'Syncer               IDLE - 0 blocks per sec @ 0 blocks / sec (avg)\r\n'
+        'Blockchain           000000000000a1e3c9... (163120), Since HEAD: 24s (SYNCED)\r\n'
+        'Accounts             HEAD @ 163120\r\n'
+        'Telemetry            STARTED - 0 <- 0 pending\r\n'
+        'Workers              STARTED - 0 -> 0 / 4 - 9.4 jobs/s\r\n'
+    ) * 3,
+    'masa': (
+        'Welcome to the Geth JavaScript console!\r\n\r\n'
+        'instance: Geth/v1.9.7-stable-6a4f9c88(quorum-v2.5.0)/linux-amd64/go1.15.5\r\n'
+        'coinbase: 0x6e6a3f0a1a5cc8efb1a7b8c3fc0c93c3fd2e1a71\r\n'
+        'at block: 1201332 (Thu, 29 Sep 2022 18:12:11 UTC)\r\n'
+        ' datadir: /qdata/dd\r\n'
+        ' modules: admin:1.0 debug:1.0 eth:1.0 ethash:1.0 miner:1.0 net:1.0 personal:1.0 rpc:1.0 txpool:1.0\r\n\r\n'
+        '> net.listening\r\n'
+        '\x1b[32mtrue\x1b[0m\r\n'
+        '> net.peerCount\r\n'
+        '\x1b[31m14\x1b[0m\r\n'
+        '> eth.syncing\r\n'
+        '{\r\n  currentBlock: 1201333,\r\n  highestBlock: 1201335,\r\n  knownStates: 0,\r\n  pulledStates: 0,\r\n'
+        '  startingBlock: 1200010\r\n}\r\n'
+        '> exit\r\n'
+    ),
+    'sui': (
+        '{\n'
+        '  "title": "Sui JSON-RPC",\n'
+        '  "description": "Sui JSON-RPC API for interaction with Sui Full node.",\n'
+        '  "contact": {\n    "name": "Mysten Labs",\n    "url": "https://mystenlabs.com",\n'
+        '    "email": "build@mystenlabs.com"\n  },\n'
+        '  "license": {\n    "name": "Apache-2.0",\n'
+        '    "url": "https://raw.githubusercontent.com/MystenLabs/sui/main/LICENSE"\n  },\n'
+        '  "version": "0.10.0"\n'
+        '}\n'
+    ),
+    'ssv': (
+        '            "Status": "running",\n'
+        '                "Status": "healthy",\n'
+    ),
+    'minimadocker': (
+        PROMPT + 'docker ps --filter status=running --format "table {{.Names}}\\t{{.Status}}"\r\n'
+        'NAMES        STATUS\r\n'
+        'minima9001   Up 5 days\r\n'
+        'watchtower   Up 2 weeks\r\n'
+        + PROMPT
+    ),
+}
+
+for cosmos in ('defund', 'nibiru', 'lava'):
+    RECORDED_ANSWERS[cosmos] = (
+        '{\n'
+        '  "latest_block_hash": "5D2B5C1C4F1E1B9D61A0B5C38B29F0B54F3C3AC0E0A2C6F4A2C3F0F6B1E4D7A9",\n'
+        '  "latest_app_hash": "A6E1C0A4F2D3B5C6E7F8091A2B3C4D5E6F708192A3B4C5D6E7F8091A2B3C4D5E",\n'
+        '  "latest_block_height": "1623312",\n'
+        '  "latest_block_time": "2022-09-30T12:11:10.123456789Z",\n'
+        '  "earliest_block_hash": "E0A2C6F4A2C3F0F6B1E4D7A95D2B5C1C4F1E1B9D61A0B5C38B29F0B54F3C3AC0",\n'
+        '  "earliest_app_hash": "E3B0C44298FC1C149AFBF4C8996FB92427AE41E4649B934CA495991B7852B855",\n'
+        '  "earliest_block_height": "1",\n'
+        '  "earliest_block_time": "2022-07-01T15:00:00Z",\n'
+        '  "catching_up": false\n'
+        '}\n'
+    )
+
+
+def legacy_remove_multiple_spaces(line):
+    new_line = ''
+
+    for i, letter in enumerate(line):
+        if i != 0 and letter == ' ' and line[i-1] == ' ':
+            continue
+        new_line += letter
+    return new_line
+
+
+def legacy_parse_answer(answer: str) -> list[str]:
+    ansi_escape = re.compile(r'(?:\x1B[@-_]|[\x80-\x9F])[0-?]*[ -/]*[@-~]')
+    answer_parsed = ansi_escape.sub('', answer)
+
+    answer_lines = []
+    for line in answer_parsed.split('\n'):
+        answer_lines += line.split('\r')
+    return [legacy_remove_multiple_spaces(line) for line in filter(lambda x: x, answer_lines)]
+
+
+def tokenizer_parse_answer(answer: bytes) -> list[str]:
+    return list(TerminalTokenizer().tokenize_chunks([answer]))
+
+
+def run() -> None:
+    print(f'{"node type":<14}{"legacy, us":>12}{"tokenizer, us":>16}{"speedup":>10}')
+    for node_type, answer in RECORDED_ANSWERS.items():
+        answer_bytes = answer.encode()
+        assert legacy_parse_answer(answer) == tokenizer_parse_answer(answer_bytes), node_type
+
+        legacy = timeit(lambda: legacy_parse_answer(answer_bytes.decode()), number=REPEAT) / REPEAT * 1e6
+        tokenizer = timeit(lambda: tokenizer_parse_answer(answer_bytes), number=REPEAT) / REPEAT * 1e6
+        print(f'{node_type:<14}{legacy:>12.1f}{tokenizer:>16.1f}{legacy / tokenizer:>9.1f}x')
+
+
+if __name__ == '__main__':
+    run()
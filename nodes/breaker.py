@@ -0,0 +1,95 @@
+"""
+    Per-target latency tracking, adaptive timeouts and circuit breaker for node checks.
+
+    Timeouts follow the observed p99 check latency of the target. After several consecutive
+    transport failures the circuit opens and the target is only probed again with exponential backoff.
+"""
+from collections import deque
+from threading import Lock
+from time import monotonic
+
+from django.conf import settings
+
+LATENCY_SAMPLES = 100
+MIN_LATENCY_SAMPLES = 5
+
+
+class TargetHealth():
+    def __init__(self) -> None:
+        self.latencies = deque(maxlen=LATENCY_SAMPLES)
+        self.failures = 0
+        self.open_until = 0
+        self.probing = False
+
+    def p99(self) -> float:
+        latencies = sorted(self.latencies)
+        return latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+
+    def backoff(self) -> float:
+        opened = self.failures - settings.BREAKER_FAILURES
+        return min(settings.BREAKER_BACKOFF * 2 ** opened, settings.BREAKER_MAX_BACKOFF)
+
+
+class TargetHealthRegistry():
+    """ Health of every checked target of the worker process """
+
+    def __init__(self) -> None:
+        self.targets = {}
+        self.lock = Lock()
+
+    def get(self, target) -> TargetHealth:
+        with self.lock:
+            return self.targets.setdefault(target, TargetHealth())
+
+    def timeout(self, target, default: float) -> float:
+        """ p99 latency with a safety factor, never above the default or below the minimum timeout
+
+        Half-open probes get the default timeout, a target recovering slowly must be able to close the circuit.
+        """
+        health = self.get(target)
+        if len(health.latencies) < MIN_LATENCY_SAMPLES or health.failures >= settings.BREAKER_FAILURES:
+            return default
+        return min(default, max(settings.ADAPTIVE_MIN_TIMEOUT, health.p99() * settings.ADAPTIVE_TIMEOUT_FACTOR))
+
+    def allow(self, target) -> str:
+        """ None if target may be probed and checked, reason otherwise, one probe passes after the backoff
+
+        Every allowed target must get exactly one record_success, record_failure or release call.
+        """
+        health = self.get(target)
+        with self.lock:
+            if health.failures < settings.BREAKER_FAILURES:
+                return None
+            now = monotonic()
+            if now >= health.open_until and not health.probing:
+                health.probing = True
+                return None
+            return (f'Circuit open after {health.failures} failures, '
+                    f'next probe in {max(health.open_until - now, 0):.0f}s')
+
+    def record_success(self, target, latency: float) -> None:
+        health = self.get(target)
+        with self.lock:
+            health.latencies.append(latency)
+            health.failures = 0
+            health.probing = False
+
+    def release(self, target) -> None:
+        """ Target was allowed but gave no outcome, next cycle may probe it again """
+        health = self.get(target)
+        with self.lock:
+            health.probing = False
+
+    def record_failure(self, target, latency: float = None) -> None:
+        """ Latency is given when the check ran out of its timeout """
+        health = self.get(target)
+        with self.lock:
+            if latency is not None:
+                health.latencies.append(latency)
+            health.failures += 1
+            health.probing = False
+            if health.failures >= settings.BREAKER_FAILURES:
+                health.open_until = monotonic() + health.backoff()
+
+
+target_health = TargetHealthRegistry()
@@ -0,0 +1,96 @@
+"""
+    In-process DNS cache shared by tcp probes, ssh and http checks, so node hostnames are resolved once per TTL.
+
+    Standard resolver does not expose record TTLs, cached answers live for DNS_CACHE_TTL seconds and failed
+    lookups for DNS_NEGATIVE_TTL. Last known addresses are kept if the resolver fails on refresh.
+"""
+import ipaddress
+import re
+import socket
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
+from time import monotonic
+
+DNS_CACHE_TTL = 5 * 60
+DNS_NEGATIVE_TTL = 30
+DNS_RESOLVE_WORKERS = 32
+
+HOSTNAME_LABEL = re.compile(r'^(?!-)[A-Za-z0-9-]{1,63}(?<!-)$')
+
+
+def is_ip_address(host: str) -> bool:
+    try:
+        ipaddress.ip_address(host)
+    except ValueError:
+        return False
+    return True
+
+
+def is_valid_address(address: str) -> bool:
+    """ IPv4, IPv6 or RFC 1123 hostname with non numeric top level label """
+    if is_ip_address(address):
+        return True
+    labels = address.rstrip('.').split('.')
+    return len(address) <= 253 and not labels[-1].isdigit() and all(map(HOSTNAME_LABEL.match, labels))
+
+
+def url_host(host: str) -> str:
+    """ Host as written in urls, IPv6 addresses go in brackets """
+    return f'[{host}]' if ':' in host else host
+
+
+class DNSCache():
+    def __init__(self, ttl=DNS_CACHE_TTL, negative_ttl=DNS_NEGATIVE_TTL) -> None:
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.entries = {}
+        self.key_locks = {}
+        self.lock = Lock()
+
+    @staticmethod
+    def lookup(host: str) -> list:
+        addresses = []
+        for *_, sockaddr in socket.getaddrinfo(host, None, type=socket.SOCK_STREAM):
+            if sockaddr[0] not in addresses:
+                addresses.append(sockaddr[0])
+        return addresses
+
+    def resolve(self, host: str) -> list:
+        """ Addresses of host in resolver order, raises socket.gaierror if it cannot be resolved """
+        if is_ip_address(host):
+            return [host]
+        with self.lock:
+            key_lock = self.key_locks.setdefault(host, Lock())
+
+        # Concurrent checks of the same host wait for one lookup
+        with key_lock:
+            expires, addresses, error = self.entries.get(host, (0, None, None))
+            if expires <= monotonic():
+                try:
+                    addresses, error = self.lookup(host), None
+                    expires = monotonic() + self.ttl
+                except socket.gaierror as e:
+                    error = None if addresses else e
+                    expires = monotonic() + self.negative_ttl
+                self.entries[host] = (expires, addresses, error)
+        if error is not None:
+            raise error
+        return addresses
+
+    def resolve_many(self, hosts: set) -> dict:
+        """ Resolve hosts concurrently, returns addresses or resolver error of every host """
+        hosts = list(hosts)
+
+        def resolve_host(host):
+            try:
+                return self.resolve(host)
+            except socket.gaierror as e:
+                return e
+
+        if len(hosts) <= 1:
+            return {host: resolve_host(host) for host in hosts}
+        with ThreadPoolExecutor(max_workers=min(len(hosts), DNS_RESOLVE_WORKERS)) as executor:
+            return dict(zip(hosts, executor.map(resolve_host, hosts)))
+
+
+dns_cache = DNSCache()
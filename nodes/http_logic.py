@@ -0,0 +1,58 @@
+"""
+    Process-wide pooled HTTP client for node API checks and explorer lookups.
+"""
+from threading import Lock
+
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+from urllib3.util import connection
+from urllib3.util.retry import Retry
+
+from nodes.dns_cache import dns_cache
+
+session = None
+session_lock = Lock()
+
+
+urllib3_create_connection = connection.create_connection
+
+
+def create_connection(address, *args, **kwargs):
+    """ urllib3 connection through cached host addresses, next address is tried if one does not answer """
+    host, port = address
+    addresses = dns_cache.resolve(host)
+    for ip in addresses:
+        try:
+            return urllib3_create_connection((ip, port), *args, **kwargs)
+        except OSError:
+            if ip == addresses[-1]:
+                raise
+
+
+def get_session() -> requests.Session:
+    """ Keep-alive session shared by all checks of the worker process """
+    global session
+    with session_lock:
+        if session is None:
+            retry = Retry(total=settings.HTTP_RETRIES, connect=settings.HTTP_RETRIES, read=0,
+                          backoff_factor=settings.HTTP_RETRY_BACKOFF, status_forcelist=(502, 503, 504),
+                          allowed_methods=('GET', 'POST'), raise_on_status=False)
+            adapter = HTTPAdapter(pool_connections=settings.HTTP_POOL_HOSTS,
+                                  pool_maxsize=settings.HTTP_POOL_PER_HOST, max_retries=retry)
+            connection.create_connection = create_connection
+            session = requests.Session()
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+        return session
+
+
+def http_get(url: str, timeout: tuple = None, **kwargs) -> requests.Response:
+    return get_session().get(
+        url, timeout=timeout or (settings.HTTP_CONNECT_TIMEOUT, settings.HTTP_READ_TIMEOUT), **kwargs)
+
+
+def http_post(url: str, data: bytes, timeout: tuple = None, **kwargs) -> requests.Response:
+    return get_session().post(
+        url, data=data, headers={'Content-Type': 'application/json'},
+        timeout=timeout or (settings.HTTP_CONNECT_TIMEOUT, settings.HTTP_READ_TIMEOUT), **kwargs)
@@ -0,0 +1,97 @@
+"""
+    Host inventory snapshot, one docker and one systemd query per host serve all container and unit checkers.
+"""
+import json
+from threading import Lock
+from time import monotonic
+
+from nodes.ssh_logic import SSHConnector
+
+INVENTORY_TTL = 60
+DOCKER_PS = "docker ps -a --format '{{json .}}'"
+DOCKER_OK_MARKER = '__NODE_INVENTORY_DOCKER_OK'
+UNITS_MARKER = '__NODE_INVENTORY_UNITS'
+
+
+class HostInventory():
+    docker_ok = False
+
+    def __init__(self, units: set) -> None:
+        self.units_queried = set(units)
+        self.containers = {}
+        self.units = {}
+        self.created = monotonic()
+
+    @staticmethod
+    def command(units: set) -> str:
+        cmd = f'{{ {DOCKER_PS} 2>/dev/null || sudo -n {DOCKER_PS} 2>/dev/null; }} && echo {DOCKER_OK_MARKER}; ' \
+            f'echo {UNITS_MARKER}'
+        if units:
+            cmd += f'; systemctl show -p Id,ActiveState,SubState {" ".join(sorted(units))} 2>/dev/null'
+        return cmd
+
+    def parse(self, answer: list[str]) -> None:
+        unit_lines = False
+        unit = {}
+        for line in answer:
+            if line == DOCKER_OK_MARKER:
+                self.docker_ok = True
+            elif line == UNITS_MARKER:
+                unit_lines = True
+            elif not unit_lines and line.startswith('{'):
+                container = json.loads(line)
+                self.containers[container.get('Names')] = container
+            elif unit_lines and '=' in line:
+                # systemctl show separates units by blank lines, a repeated key starts the next unit
+                key, value = line.split('=', 1)
+                if key in unit:
+                    self.add_unit(unit)
+                    unit = {}
+                unit[key] = value
+        self.add_unit(unit)
+
+    def add_unit(self, unit: dict) -> None:
+        if unit.get('Id'):
+            self.units[unit['Id'].removesuffix('.service')] = unit
+
+    def is_fresh(self, units: set) -> bool:
+        return monotonic() - self.created < INVENTORY_TTL and units <= self.units_queried
+
+    def unit_active_line(self, name: str) -> str:
+        """ Same Active line as systemctl status gives, None if the unit was not queried """
+        unit = self.units.get(name)
+        if unit is None:
+            return None
+        return f'Active: {unit.get("ActiveState")} ({unit.get("SubState")})'
+
+    def container(self, name: str, exact: bool = False) -> dict:
+        """ Container found by name or name part, None if docker was not available """
+        if not self.docker_ok:
+            return None
+        if exact:
+            return self.containers.get(name, {})
+        for container_name, container in self.containers.items():
+            if name in container_name:
+                return container
+        return {}
+
+
+inventory_cache = {}
+inventory_lock = Lock()
+
+
+def get_host_inventory(connector: SSHConnector, units: set) -> HostInventory:
+    """ Snapshot of host containers and units, cached for the check cycle """
+    key = connector.pool_key()
+    with inventory_lock:
+        inventory = inventory_cache.get(key)
+    if inventory is not None and inventory.is_fresh(units):
+        return inventory
+
+    inventory = HostInventory(units)
+    connector = SSHConnector(connector.host, connector.username, connector.password,
+                             key_path=connector.key_path, key_passphrase=connector.key_passphrase)
+    inventory.parse(connector.exec_command_direct(HostInventory.command(units)))
+    with inventory_lock:
+        inventory_cache[key] = inventory
+    return inventory
@@ -1,50 +1,86 @@
+import asyncio
+import hashlib
 import json
-import re
+import os
+import random
+import shlex
 import traceback
 from abc import abstractmethod
-from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from time import monotonic
+from urllib.parse import urlsplit
 
+import paramiko
 import requests
 from django.conf import settings
+from django.db import transaction
 from django.utils import timezone
 
-from nodes.models import CheckHistory, Node
-from nodes.ssh_logic import SSHConnector
+from nodes.models import CheckHistory, CheckTarget, Node, NodeTypeSchedule
+from nodes.breaker import target_health
+from nodes.dns_cache import is_valid_address, url_host
+from nodes.http_logic import http_get, http_post
+from nodes.inventory import HostInventory, get_host_inventory
+from nodes.metrics import scrape_metrics
+from nodes.probe import probe_targets
+from nodes.reference_data import get_chain_height, get_reference_json
+from nodes.ssh_logic import MAX_ANSWER_BYTES, MULTIPLE_SPACES, SSH_PORT, SSHConnector
 from tgbot.handlers.broadcast_message.utils import _send_message
 
 MAX_ERROR_LEN = 50
+RPC_TIMEOUT = (2, 5)
+RPC_RETRY_AFTER = 30 * 60
+COSMOS_RPC_PORT = 26657
+COSMOS_SYNC_LAG = 30000
+APTOS_SYNC_LAG = 10
 ADMIN_USERNAME = 'tomatto'
+TARGET_STATUS_FIELDS = ['last_checked', 'last_status', 'last_status_text', 'last_reward_value']
+NODE_STATUS_FIELDS = TARGET_STATUS_FIELDS + ['same_status_count', 'notified_status', 'next_check_at']
+MAX_BACKOFF_POWER = 10
+rpc_unavailable = {}
 
 
 def remove_multiple_spaces(line):
-    new_line = ''
-
-    for i, letter in enumerate(line):
-        if i != 0 and letter == ' ' and line[i-1] == ' ':
-            continue
-        new_line += letter
-    return new_line
+    return MULTIPLE_SPACES.sub(' ', line)
 
 
 class BaseNodeCheckerAPI():
     node_type = None
     node_api = None
+    timeout = None
+    transport_failed = False
 
     def __init__(self, ip, port):
         node_api_template = NODE_TYPES[self.node_type].get('api')
-        self.node_api = node_api_template.format(ip, port)
+        self.node_api = node_api_template.format(url_host(ip), port)
+
+    def probe_target(self) -> tuple:
+        """ (host, port) of the node api, ValueError if the node address or port is not valid """
+        url = urlsplit(self.node_api)
+        if not url.hostname:
+            raise ValueError(f'No host in {self.node_api}')
+        return (url.hostname, url.port or (443 if url.scheme == 'https' else 80))
+
+    def health_key(self) -> tuple:
+        """ Key of the breaker and latency state """
+        return self.probe_target()
 
     @staticmethod
     def external_api_check(url):
-        try:
-            return requests.get(url, timeout=15).json()
-        except Exception:
-            return {}
+        return get_reference_json(url)
+
+    def default_timeout(self) -> float:
+        return settings.HTTP_READ_TIMEOUT
+
+    def apply_timeout(self, timeout: float) -> None:
+        self.timeout = (settings.HTTP_CONNECT_TIMEOUT, timeout)
 
     def health_check(self):
         try:
-            return self.parse_answer(requests.get(self.node_api, timeout=15))
+            return self.parse_answer(http_get(self.node_api, timeout=self.timeout))
         except Exception as e:
+            self.transport_failed = True
             return (False, f'Wrong request answer {str(e)[:MAX_ERROR_LEN]}')
 
     def parse_answer(self, answer):
@@ -62,29 +98,112 @@ class BaseNodeCheckerAPI():
         pass
 
 
+class BaseNodeCheckerMetrics(BaseNodeCheckerAPI):
+    """ Prometheus /metrics checker, the answer is streamed and only wanted families are parsed """
+    metrics: list = []
+
+    def health_check(self):
+        try:
+            with http_get(self.node_api, timeout=self.timeout, stream=True) as answer:
+                if answer.status_code > 300:
+                    return (False, f'Wrong request answer code {answer.status_code}')
+                metrics = scrape_metrics(
+                    (line.decode(errors='replace') for line in answer.iter_lines()), self.metrics)
+        except Exception as e:
+            self.transport_failed = True
+            return (False, f'Wrong request answer {str(e)[:MAX_ERROR_LEN]}')
+        try:
+            return self.parse_metrics(metrics)
+        except Exception as e:
+            return (False, f'Wrong metrics parsing {str(e)[:MAX_ERROR_LEN]}')
+
+    @abstractmethod
+    def parse_metrics(self, metrics: dict):
+        pass
+
+
 class BaseNodeCheckerSSH():
     node_type: str = None
     sudo: bool = False
     screen: bool = False
+    interactive: bool = False
+    transport_failed: bool = False
+    inventory_units: list = []
+    inventory_containers: list = []
+    max_answer_bytes: int = MAX_ANSWER_BYTES
     cmds: list = None
 
     def __init__(self, ip: str, username: str, password: str, screen: bool, sudo: bool, **kwargs) -> None:
-        self.ssh = SSHConnector(ip, username, password, **kwargs)
+        self.ssh = SSHConnector(ip, username, password, max_answer_bytes=self.max_answer_bytes, **kwargs)
         self.screen = screen
         self.sudo = sudo
         self.username = username
+        self.key_auth = False
 
     @staticmethod
     def external_api_check(url: str) -> dict:
+        return get_reference_json(url)
+
+    def probe_target(self) -> tuple:
+        return (self.ssh.host, SSH_PORT)
+
+    def health_key(self) -> tuple:
+        """ Key of the breaker and latency state, wrong credentials of one user must not open the circuit of others """
         try:
-            return requests.get(url, timeout=15).json()
+            return self.ssh.pool_key()
         except Exception:
-            return {}
+            return (self.ssh.host, self.ssh.username, None)
+
+    def default_timeout(self) -> float:
+        return self.ssh.max_command_wait
+
+    def apply_timeout(self, timeout: float) -> None:
+        self.ssh.max_command_wait = timeout
+
+    def use_key(self, key_path: str, key_passphrase: str = None) -> None:
+        self.ssh.key_path = key_path
+        self.ssh.key_passphrase = key_passphrase
+        self.key_auth = True
+
+    def use_direct_exec(self) -> bool:
+        # Without screen or console input one plain exec channel is enough, no pty needed,
+        # sudo goes through non interactive sudo -n when there is no password to type
+        return (not self.sudo or self.key_auth) and not self.screen and not self.interactive and len(self.cmds) == 1
+
+    def direct_cmd(self) -> str:
+        if self.sudo:
+            return f'sudo -n sh -c {shlex.quote(self.cmds[0])}'
+        return self.cmds[0]
+
+    def batch_key(self):
+        # Direct exec and inventory checks of the same host and credentials can share one ssh round trip
+        if self.use_direct_exec() or self.inventory_units or self.inventory_containers:
+            try:
+                return self.ssh.pool_key()
+            except Exception:
+                # Unreadable key fails in own health_check
+                return None
+        return None
+
+    def inventory_answer(self, inventory: HostInventory):
+        """ Answer lines built from the host inventory snapshot, None to run own cmds """
+        return None
+
+    def http_check(self):
+        """ Status checked without ssh, None to run own cmds """
+        return None
 
     def health_check(self):
+        http_status = self.http_check()
+        if http_status is not None:
+            return http_status
         try:
-            return self.parse_answer(self.ssh.exec_commands(self.cmds, self.screen, self.sudo))
+            if self.use_direct_exec():
+                return self.parse_answer(self.ssh.exec_command_direct(self.direct_cmd()))
+            return self.parse_answer(self.ssh.exec_commands(self.cmds, self.screen, self.sudo, self.interactive))
         except Exception as e:
+            # Rejected credentials are not a host failure
+            self.transport_failed = not isinstance(e, paramiko.AuthenticationException)
             return (False, f'Wrong ssh answer {str(e)[:MAX_ERROR_LEN]}')
 
     def parse_answer(self, answer):
@@ -105,27 +224,6 @@ class AptosNodeChecker(BaseNodeCheckerAPI):
         super().__init__(ip, port)
 
     def parse_unique_answer(self, answer: list[str]):
-        # aptos_ledger_version = self.external_api_check('https://fullnode.devnet.aptoslabs.com/').get('ledger_version')
-
-        # sync_lines = list(filter(lambda x: 'aptos_state_sync_version' in x, answer.split('\n')))
-        # if not len(sync_lines):
-        #     return (False, f'Wrong aptos_state_sync_version reply')
-
-        # applied_block_find = list(filter(lambda x: 'applied_transaction_outputs' in x, sync_lines))
-        # if not len(applied_block_find):
-        #     return (False, f'Wrong aptos_state_sync_version applied reply')
-        # applied_block = applied_block_find[0].split(' ')[-1]
-
-        # synced_block_find = list(filter(lambda x: 'synced' in x, sync_lines))
-        # if not len(synced_block_find):
-        #     return (False, f'Wrong aptos_state_sync_version synced reply')
-        # synced_block = synced_block_find[0].split(' ')[-1]
-
-        # if aptos_ledger_version and abs(int(aptos_ledger_version) - int(synced_block)) > 10:
-        #     return (False, f'Something wrong in sync process, ledger {aptos_ledger_version}, synced {synced_block}')
-
-        # if aptos_ledger_version and abs(int(aptos_ledger_version) - int(applied_block)) > 10:
-        #     return (False, f'Something wrong in sync process, ledger {aptos_ledger_version}, applied {applied_block}')
         answer = json.loads(answer)
 
         ledger_version = answer.get('ledger_version')
@@ -141,6 +239,27 @@ class AptosNodeChecker(BaseNodeCheckerAPI):
         return (True, f'Node is OK, ledger {ledger_version}, dt {ledger_timestamp_dt}', 0)
 
 
+class AptosMetricsNodeChecker(BaseNodeCheckerMetrics):
+    metrics = ['aptos_state_sync_version']
+
+    def __init__(self, ip, port):
+        self.node_type = NODE_TYPE_APTOS_METRICS
+        super().__init__(ip, port)
+
+    def parse_metrics(self, metrics: dict):
+        sync_versions = {labels.get('type'): value for labels, value in metrics.get('aptos_state_sync_version', [])}
+        synced = sync_versions.get('synced')
+        if synced is None:
+            return (False, 'Wrong aptos_state_sync_version synced reply')
+        applied = sync_versions.get('applied_transaction_outputs')
+        if applied is None:
+            return (False, 'Wrong aptos_state_sync_version applied reply')
+        if abs(int(synced) - int(applied)) > APTOS_SYNC_LAG:
+            return (False, f'Something wrong in sync process, synced {int(synced)}, applied {int(applied)}')
+
+        return (True, f'Node is OK, synced {int(synced)}, applied {int(applied)}', 0)
+
+
 class MinimaNodeChecker(BaseNodeCheckerAPI):
 
     def __init__(self, ip, port):
@@ -202,11 +321,16 @@ class MassaNodeChecker(BaseNodeCheckerSSH):
 
 
 class StarknetNodeChecker(BaseNodeCheckerSSH):
+    inventory_units = ['starknetd']
 
     def __init__(self, ip: str, username: str, password: str, screen: bool, sudo: bool):
         self.cmds = ["systemctl status starknetd | grep Active"]
         super().__init__(ip, username, password, screen, True)
 
+    def inventory_answer(self, inventory: HostInventory):
+        active_line = inventory.unit_active_line('starknetd')
+        return [active_line] if active_line else None
+
     def parse_unique_answer(self, answer: list[str]):
 
         active_find = list(filter(lambda x: 'Active:' in x, answer[::-1]))
@@ -219,11 +343,16 @@ class StarknetNodeChecker(BaseNodeCheckerSSH):
 
 
 class AleoNodeChecker(BaseNodeCheckerSSH):
+    inventory_units = ['1to-miner']
 
     def __init__(self, ip: str, username: str, password: str, screen: bool, sudo: bool):
         self.cmds = ["systemctl status 1to-miner | grep Active"]
         super().__init__(ip, username, password, screen, True)
 
+    def inventory_answer(self, inventory: HostInventory):
+        active_line = inventory.unit_active_line('1to-miner')
+        return [active_line] if active_line else None
+
     def parse_unique_answer(self, answer: list[str]):
 
         active_find = list(filter(lambda x: 'Active:' in x, answer[::-1]))
@@ -280,85 +409,37 @@ class ShardeumNodeChecker(BaseNodeCheckerSSH):
         return (True, f'Node is OK, state standby, stake {stake}, rewards {rewards}', rewards)
 
 
-class DefundNodeChecker(BaseNodeCheckerSSH):
+class CosmosNodeChecker(BaseNodeCheckerSSH):
+    """ Cosmos SDK node, tendermint rpc /status over http, node cli over ssh as fallback """
+    chain: str = None
 
     def __init__(self, ip: str, username: str, password: str, screen: bool, sudo: bool):
+        self.ip = ip
+        self.chain_context = COSMOS_CHAINS[self.chain]
         self.cmds = [
-            ". $HOME/.bashrc && . $HOME/.profile && defundd status 2>&1 | jq .\"SyncInfo\""]
+            f". $HOME/.bashrc && . $HOME/.profile && {self.chain_context['binary']} status 2>&1 | jq .\"SyncInfo\""]
         super().__init__(ip, username, password, screen, sudo)
 
-    def parse_unique_answer(self, answer: list[str]):
-        defund_current_height = None
+    def http_check(self):
+        rpc = f'http://{url_host(self.ip)}:{self.chain_context.get("rpc_port", COSMOS_RPC_PORT)}'
+        if rpc_unavailable.get(rpc, 0) > monotonic():
+            return None
         try:
-            defund_current_height = self.external_api_check(
-                'https://defund.api.explorers.guru/api/v1/blocks?limit=1')
+            sync_info = http_get(f'{rpc}/status', timeout=RPC_TIMEOUT).json()['result']['sync_info']
+            peers = None
+            if self.chain_context.get('net_info'):
+                peers = int(http_get(f'{rpc}/net_info', timeout=RPC_TIMEOUT).json()['result']['n_peers'])
         except Exception:
-            pass
-        if isinstance(defund_current_height, dict) and len(defund_current_height.get('data', [])):
-            defund_current_height = defund_current_height.get('data')[
-                0].get('height', 0)
-
-        defund_current_wallet = None
-        if self.username == ADMIN_USERNAME:
-            try:
-                defund_current_wallet_check = self.external_api_check(
-                    'https://defund.api.explorers.guru/api/v1/accounts/defund1pkglxk0nr3xxxslcwgtf8d6a9du9u7l59a7552/balance')
-            except Exception:
-                pass
-            if isinstance(defund_current_wallet_check, dict) and len(defund_current_wallet_check.get('tokens', [])):
-                defund_current_wallet = round(
-                    defund_current_wallet_check.get('tokens')[0].get('amount', 0), 2)
-
-        latest_block_height_find = list(
-            filter(lambda x: 'latest_block_height' in x, answer[::-1]))
-        if not len(latest_block_height_find):
-            return (False, 'Wrong latest_block_height_find reply')
-        latest_block_height = latest_block_height_find[0].strip().split(
-            ' ')[-1][1:-2]
-
-        catching_up_find = list(
-            filter(lambda x: 'catching_up' in x, answer[::-1]))
-        if not len(catching_up_find):
-            return (False, 'Wrong catching_up reply')
-        catching_up = catching_up_find[0].strip().split(' ')[-1]
-        if catching_up != 'false':
-            return (False, f'Wrong catching_up status {catching_up}, current_block {defund_current_height} latest_block_height {latest_block_height}')
-        print(defund_current_height, latest_block_height)
-        if defund_current_height and abs(int(defund_current_height) - int(latest_block_height)) > 30000:
-            return (False, f'Something wrong in sync process, current_block {defund_current_height}, latest_block_height {latest_block_height}')
-
-        return (True, f'Node is OK, current_block {defund_current_height} latest_block_height {latest_block_height}, amount: {defund_current_wallet}', defund_current_wallet)
-
-
-class NibiruNodeChecker(BaseNodeCheckerSSH):
-
-    def __init__(self, ip: str, username: str, password: str, screen: bool, sudo: bool):
-        self.cmds = [
-            ". $HOME/.bashrc && . $HOME/.profile && nibid status 2>&1 | jq .\"SyncInfo\""]
-        super().__init__(ip, username, password, screen, sudo)
+            # Rpc is not exposed, use ssh for a while before asking it again
+            rpc_unavailable[rpc] = monotonic() + RPC_RETRY_AFTER
+            return None
+        try:
+            return self.sync_status(str(sync_info['latest_block_height']), str(sync_info['catching_up']).lower(), peers)
+        except Exception as e:
+            return (False, f'Wrong rpc answer parsing {str(e)[:MAX_ERROR_LEN]}')
 
     def parse_unique_answer(self, answer: list[str]):
-        nibiru_current_height = None
-        try:
-            nibiru_current_height = self.external_api_check('https://nibiru.api.explorers.guru/api/v1/blocks?limit=1')
-        except Exception:
-            pass
-        if isinstance(nibiru_current_height, dict) and len(nibiru_current_height.get('data', [])):
-            nibiru_current_height = nibiru_current_height.get('data')[0].get('height', 0)
-
-        nibiru_current_wallet = None
-        # if self.username == ADMIN_USERNAME:
-        #     try:
-        #         nibiru_current_wallet = self.external_api_check(
-        #             'https://nibiru.api.explorers.guru/api/v1/accounts/nibi1ttup4wkg4smsvr4aj8huzsywlp7szdwpwr2g0l/balance'
-        #         )
-        #     except Exception:
-        #         pass
-        #     if isinstance(nibiru_current_wallet, dict) and len(nibiru_current_wallet.get('tokens', [])):
-        #         nibiru_current_wallet = round(nibiru_current_wallet.get('tokens')[0].get('amount', 0), 2)
-
-        latest_block_height_find = list(
-            filter(lambda x: 'latest_block_height' in x, answer[::-1]))
+        latest_block_height_find = list(filter(lambda x: 'latest_block_height' in x, answer[::-1]))
         if not len(latest_block_height_find):
             return (False, 'Wrong latest_block_height_find reply')
         latest_block_height = latest_block_height_find[0].strip().split(' ')[-1][1:-2]
@@ -367,57 +448,29 @@ class NibiruNodeChecker(BaseNodeCheckerSSH):
         if not len(catching_up_find):
             return (False, 'Wrong catching_up reply')
         catching_up = catching_up_find[0].strip().split(' ')[-1]
-        if catching_up != 'false':
-            return (False, f'Wrong catching_up status {catching_up}, current_block {nibiru_current_height} latest_block_height {latest_block_height}')
-        print(nibiru_current_height, latest_block_height)
-        if nibiru_current_height and abs(int(nibiru_current_height) - int(latest_block_height)) > 30000:
-            return (False, f'Something wrong in sync process, current_block {nibiru_current_height}, latest_block_height {latest_block_height}')
-
-        return (True, f'Node is OK, current_block {nibiru_current_height} latest_block_height {latest_block_height}, amount: {nibiru_current_wallet}', nibiru_current_wallet)
-
-
-class LavaNodeChecker(BaseNodeCheckerSSH):
+        return self.sync_status(latest_block_height, catching_up)
 
-    def __init__(self, ip: str, username: str, password: str, screen: bool, sudo: bool):
-        self.cmds = [". $HOME/.bashrc && . $HOME/.profile && lavad status 2>&1 | jq .\"SyncInfo\""]
-        super().__init__(ip, username, password, screen, sudo)
-
-    def parse_unique_answer(self, answer: list[str]):
-        lava_current_height = None
-        try:
-            lava_current_height = self.external_api_check('https://lava.api.explorers.guru/api/v1/blocks?limit=1')
-        except Exception:
-            pass
-        if isinstance(lava_current_height, dict) and len(lava_current_height.get('data', [])):
-            lava_current_height = lava_current_height.get('data')[
-                0].get('height', 0)
-
-        lava_current_wallet = None
-        # if self.username == ADMIN_USERNAME:
-        #     try:
-        #         lava_current_wallet = self.external_api_check('https://lava.api.explorers.guru/api/v1/accounts/lava@1vpffj5dgvvw9ae7s0ruf3jc84ff6hwgef704tt/balance')
-        #     except Exception:
-        #         pass
-        #     if isinstance(lava_current_wallet, dict) and len(lava_current_wallet.get('tokens', [])):
-        #         lava_current_wallet = round(lava_current_wallet.get('tokens')[0].get('amount', 0), 2)
+    def sync_status(self, latest_block_height: str, catching_up: str, peers: int = None):
+        current_height = get_chain_height(self.chain)
 
-        latest_block_height_find = list(filter(lambda x: 'latest_block_height' in x, answer[::-1]))
-        if not len(latest_block_height_find):
-            return (False, 'Wrong latest_block_height_find reply')
-        latest_block_height = latest_block_height_find[0].strip().split(' ')[-1][1:-2]
+        current_wallet = None
+        wallet_api = self.chain_context.get('wallet_api')
+        if wallet_api and self.username == ADMIN_USERNAME:
+            current_wallet_check = self.external_api_check(wallet_api)
+            if isinstance(current_wallet_check, dict) and len(current_wallet_check.get('tokens', [])):
+                current_wallet = round(current_wallet_check.get('tokens')[0].get('amount', 0), 2)
 
-        catching_up_find = list(
-            filter(lambda x: 'catching_up' in x, answer[::-1]))
-        if not len(catching_up_find):
-            return (False, 'Wrong catching_up reply')
-        catching_up = catching_up_find[0].strip().split(' ')[-1]
         if catching_up != 'false':
-            return (False, f'Wrong catching_up status {catching_up}, current_block {lava_current_height} latest_block_height {latest_block_height}')
-        print(lava_current_height, latest_block_height)
-        if lava_current_height and abs(int(lava_current_height) - int(latest_block_height)) > 30000:
-            return (False, f'Something wrong in sync process, current_block {lava_current_height}, latest_block_height {latest_block_height}')
+            return (False, f'Wrong catching_up status {catching_up}, current_block {current_height} '
+                           f'latest_block_height {latest_block_height}')
+        if peers == 0:
+            return (False, f'No peers, latest_block_height {latest_block_height}')
+        if current_height and abs(int(current_height) - int(latest_block_height)) > COSMOS_SYNC_LAG:
+            return (False, f'Something wrong in sync process, current_block {current_height}, '
+                           f'latest_block_height {latest_block_height}')
 
-        return (True, f'Node is OK, current_block {lava_current_height} latest_block_height {latest_block_height}, amount: {lava_current_wallet}', lava_current_wallet)
+        return (True, f'Node is OK, current_block {current_height} latest_block_height {latest_block_height}, '
+                      f'amount: {current_wallet}', current_wallet)
 
 
 class IronfishNodeChecker(BaseNodeCheckerSSH):
@@ -425,8 +478,7 @@ class IronfishNodeChecker(BaseNodeCheckerSSH):
     def __init__(self, ip: str, username: str, password: str, screen: bool, sudo: bool):
         self.cmds = [". $HOME/.bashrc && . $HOME/.bash_profile && ironfish status"]
         super().__init__(ip, username, password, screen, sudo,
-                         after_command_wait=6, max_command_wait=18,
-                         channel_timeout=30)
+                         max_command_wait=18, channel_timeout=30)
 
     def parse_unique_answer(self, answer: list[str]):
         node_status_find = list(filter(lambda x: 'Node ' in x, answer))
@@ -446,7 +498,58 @@ class IronfishNodeChecker(BaseNodeCheckerSSH):
         return (True, f'Node is OK, status {node_status}, {node_syncer}', 0)
 
 
-class MasaNodeChecker(BaseNodeCheckerSSH):
+class JsonRpcNodeChecker(BaseNodeCheckerSSH):
+    """ Node with json-rpc api, one batch request directly or through ssh port forward, own cmds as fallback """
+    rpc_port: int = None
+    rpc_calls: list = []
+
+    def rpc_request(self) -> bytes:
+        calls = [{'jsonrpc': '2.0', 'id': i, 'method': method, 'params': params}
+                 for i, (method, params) in enumerate(self.rpc_calls)]
+        return json.dumps(calls if len(calls) > 1 else calls[0]).encode()
+
+    def rpc_results(self, answer) -> dict:
+        results = {}
+        for item in answer if isinstance(answer, list) else [answer]:
+            method = self.rpc_calls[item['id']][0]
+            if item.get('error'):
+                raise ValueError(f'{method} error {item["error"]}')
+            results[method] = item['result']
+        return results
+
+    def http_check(self):
+        body = self.rpc_request()
+        answer = None
+        rpc = f'http://{url_host(self.ssh.host)}:{self.rpc_port}'
+        forward = f'ssh://{self.ssh.host}:{self.rpc_port}'
+        if rpc_unavailable.get(rpc, 0) <= monotonic():
+            try:
+                answer = http_post(rpc, body, timeout=RPC_TIMEOUT).json()
+            except Exception:
+                rpc_unavailable[rpc] = monotonic() + RPC_RETRY_AFTER
+        if answer is None and rpc_unavailable.get(forward, 0) <= monotonic():
+            # Rpc is bound to localhost mostly, reach it through the pooled ssh transport
+            try:
+                answer = json.loads(self.ssh.forward_http_post(self.rpc_port, '/', body))
+            except Exception:
+                rpc_unavailable[forward] = monotonic() + RPC_RETRY_AFTER
+        if answer is None:
+            return None
+
+        try:
+            return self.parse_rpc_results(self.rpc_results(answer))
+        except Exception as e:
+            return (False, f'Wrong rpc answer parsing {str(e)[:MAX_ERROR_LEN]}')
+
+    @abstractmethod
+    def parse_rpc_results(self, results: dict):
+        pass
+
+
+class MasaNodeChecker(JsonRpcNodeChecker):
+    interactive = True
+    rpc_port = 8545
+    rpc_calls = [('net_listening', []), ('net_peerCount', []), ('eth_syncing', [])]
 
     def __init__(self, ip: str, username: str, password: str, screen: bool, sudo: bool):
         self.cmds = ["docker exec -it masa-node-v10_masa-node_1 geth attach /qdata/dd/geth.ipc",
@@ -461,6 +564,25 @@ class MasaNodeChecker(BaseNodeCheckerSSH):
                 return answer[index+1]
         return False
 
+    def parse_rpc_results(self, results: dict):
+        if results['net_listening'] is not True:
+            return (False, f'Wrong node_listen reply, not true: {results["net_listening"]}')
+        node_peer_count = int(results['net_peerCount'], 16)
+        if node_peer_count == 0:
+            return (False, f'Wrong node_peer_count reply, {node_peer_count} nodes')
+
+        node_peer_syncing = results['eth_syncing']
+        if node_peer_syncing is False:
+            return (True, f'Node is OK, peers {node_peer_count}, syncing false', 0)
+
+        node_current_block = int(node_peer_syncing['currentBlock'], 16)
+        node_highest_block = int(node_peer_syncing['highestBlock'], 16)
+        if abs(node_current_block - node_highest_block) > 10:
+            return (False, f'Wrong node_blocks reply, current {node_current_block}, highest {node_highest_block}')
+
+        return (True, f'Node is OK, peers {node_peer_count}, current_block {node_current_block}, '
+                      f'highest_block {node_highest_block}', 0)
+
     def parse_unique_answer(self, answer: list[str]):
         node_listen_find = self.get_next_to_finded_line(
             answer, 'net.listening')
@@ -498,13 +620,18 @@ class MasaNodeChecker(BaseNodeCheckerSSH):
         return (True, f'Node is OK, peers {node_peer_count}, current_block {node_current_block}, highest_block {node_highest_block}', 0)
 
 
-class SuiNodeChecker(BaseNodeCheckerSSH):
+class SuiNodeChecker(JsonRpcNodeChecker):
+    rpc_port = 9000
+    rpc_calls = [('rpc.discover', [])]
 
     def __init__(self, ip: str, username: str, password: str, screen: bool, sudo: bool):
         self.cmds = [
             "curl -s -X POST http://127.0.0.1:9000 -H 'Content-Type: application/json' -d '{ \"jsonrpc\":\"2.0\", \"method\":\"rpc.discover\",\"id\":1}' | jq .result.info"]
         super().__init__(ip, username, password, screen, False)
 
+    def parse_rpc_results(self, results: dict):
+        return (True, f'Node is OK, version {results["rpc.discover"]["info"]["version"]}', 0)
+
     def parse_unique_answer(self, answer: list[str]):
         version_find = list(filter(lambda x: 'version' in x, answer[::-1]))
         if not len(version_find):
@@ -515,11 +642,18 @@ class SuiNodeChecker(BaseNodeCheckerSSH):
 
 
 class SsvNodeChecker(BaseNodeCheckerSSH):
+    inventory_containers = ['ssv_node']
 
     def __init__(self, ip: str, username: str, password: str, screen: bool, sudo: bool):
         self.cmds = ["docker inspect ssv_node | grep Status"]
         super().__init__(ip, username, password, screen, sudo)
 
+    def inventory_answer(self, inventory: HostInventory):
+        container = inventory.container('ssv_node', exact=True)
+        if container is None or (container and not container.get('State')):
+            return None
+        return [f'"Status": "{container["State"]}",'] if container else []
+
     def parse_unique_answer(self, answer: list[str]):
         status_find = list(filter(lambda x: 'Status' in x, answer[::-1]))
         if not len(status_find):
@@ -532,11 +666,21 @@ class SsvNodeChecker(BaseNodeCheckerSSH):
 
 
 class MinimaDockerNodeChecker(BaseNodeCheckerSSH):
+    inventory_containers = ['minima9001']
 
     def __init__(self, ip: str, username: str, password: str, screen: bool, sudo: bool):
         self.cmds = [r'docker ps --filter status=running --format "table {{.Names}}\t{{.Status}}"']
         super().__init__(ip, username, password, screen, True)
 
+    def inventory_answer(self, inventory: HostInventory):
+        container = inventory.container('minima9001')
+        if container is None or (container and not container.get('State')):
+            # No docker or docker without State field, the checker runs own cmds
+            return None
+        if container.get('State') != 'running':
+            return []
+        return [f'{container.get("Names")} {container.get("Status")}']
+
     def parse_unique_answer(self, answer: list[str]):
 
         status_find = list(filter(lambda x: 'minima9001' in x, answer))
@@ -550,6 +694,7 @@ CHECKER_API_CLASS = 'api'
 CHECKER_SSH_CLASS = 'ssh'
 
 NODE_TYPE_APTOS = 'aptos'
+NODE_TYPE_APTOS_METRICS = 'aptosmetrics'
 NODE_TYPE_MINIMA = 'minima'
 NODE_TYPE_MINIMA_DOCKER = 'minimadocker'
 NODE_TYPE_MASSA = 'massa'
@@ -570,6 +715,11 @@ NODE_TYPES = {
         'checker': CHECKER_API_CLASS,
         'api': 'http://{}:{}'
     },
+    NODE_TYPE_APTOS_METRICS: {
+        'class': AptosMetricsNodeChecker,
+        'checker': CHECKER_API_CLASS,
+        'api': 'http://{}:{}/metrics'
+    },
     NODE_TYPE_MINIMA: {
         'class': MinimaNodeChecker,
         'checker': CHECKER_API_CLASS,
@@ -587,10 +737,6 @@ NODE_TYPES = {
         'class': StarknetNodeChecker,
         'checker': CHECKER_SSH_CLASS
     },
-    NODE_TYPE_DEFUND: {
-        'class': DefundNodeChecker,
-        'checker': CHECKER_SSH_CLASS
-    },
     NODE_TYPE_IRONFISH: {
         'class': IronfishNodeChecker,
         'checker': CHECKER_SSH_CLASS
@@ -607,10 +753,6 @@ NODE_TYPES = {
         'class': SsvNodeChecker,
         'checker': CHECKER_SSH_CLASS
     },
-    NODE_TYPE_NIBIRU: {
-        'class': NibiruNodeChecker,
-        'checker': CHECKER_SSH_CLASS
-    },
     NODE_TYPE_ALEO: {
         'class': AleoNodeChecker,
         'checker': CHECKER_SSH_CLASS
@@ -619,32 +761,360 @@ NODE_TYPES = {
         'class': ShardeumNodeChecker,
         'checker': CHECKER_SSH_CLASS
     },
+}
+
+# Cosmos SDK chains are plain data, rpc_port and net_info (require peers) are optional
+COSMOS_CHAINS = {
+    NODE_TYPE_DEFUND: {
+        'binary': 'defundd',
+        'wallet_api': 'https://defund.api.explorers.guru/api/v1/accounts/defund1pkglxk0nr3xxxslcwgtf8d6a9du9u7l59a7552/balance',
+    },
+    NODE_TYPE_NIBIRU: {
+        'binary': 'nibid',
+    },
     NODE_TYPE_LAVA: {
-        'class': LavaNodeChecker,
-        'checker': CHECKER_SSH_CLASS
+        'binary': 'lavad',
     },
 }
 
+for cosmos_chain in COSMOS_CHAINS:
+    NODE_TYPES[cosmos_chain] = {
+        'class': type(f'{cosmos_chain.capitalize()}NodeChecker', (CosmosNodeChecker,), {'chain': cosmos_chain}),
+        'checker': CHECKER_SSH_CLASS
+    }
+
+
+def get_node_key_path(node):
+    """ Node own private key or the default key of its user, None for password auth """
+    if node.ssh_key_path:
+        return node.ssh_key_path
+    if settings.SSH_KEYS_DIR:
+        user_key_path = os.path.join(settings.SSH_KEYS_DIR, str(node.user_id))
+        if os.path.isfile(user_key_path):
+            return user_key_path
+    return None
+
+
+def get_node_checker(node):
+    node_context = NODE_TYPES.get(node.node_type)
+    if node_context['checker'] == CHECKER_API_CLASS:
+        checker = node_context['class'](node.node_ip, node.node_port)
+        node_description = f'{node.node_ip}:{node.node_port}'
+    else:
+        checker = node_context['class'](
+            node.node_ip, node.ssh_username, node.ssh_password, node.screen_name, node.sudo_flag)
+        key_path = get_node_key_path(node)
+        if key_path:
+            checker.use_key(key_path, node.ssh_key_passphrase)
+        node_description = f'{node.node_ip}@{node.ssh_username}'
+    return checker, node_description
+
+
+def node_target_key(node) -> str:
+    """ Same key for nodes checked the same way, credentials are part of it so a wrong one is never shared """
+    endpoint = [node.node_type, node.node_ip.lower().rstrip('.')]
+    if NODE_TYPES[node.node_type]['checker'] == CHECKER_API_CLASS:
+        endpoint.append(node.node_port)
+    else:
+        endpoint += [node.ssh_username, node.ssh_password, get_node_key_path(node), node.ssh_key_passphrase,
+                     node.screen_name, node.sudo_flag]
+    return hashlib.sha256(json.dumps(endpoint).encode()).hexdigest()
+
+
+def subscribe_node(node) -> CheckTarget:
+    key = node_target_key(node)
+    if node.target is None or node.target.key != key:
+        node.target, _ = CheckTarget.objects.get_or_create(
+            key=key, defaults={'node_type': node.node_type, 'node_ip': node.node_ip})
+        node.save(update_fields=['target'])
+    return node.target
+
+
+def target_is_fresh(target: CheckTarget, max_result_age: float) -> bool:
+    return bool(target.last_checked) and (timezone.now() - target.last_checked).total_seconds() < max_result_age
+
+
+def plan_target_batches(nodes: list, max_result_age: float) -> list:
+    """ Node ids of stale targets grouped by host, one representative node per target, one batch per check task """
+    planned = set()
+    batches = {}
+    for node in nodes:
+        target = subscribe_node(node)
+        if target.id in planned or target_is_fresh(target, max_result_age):
+            continue
+        planned.add(target.id)
+        batches.setdefault(node.node_ip.lower().rstrip('.'), []).append(node.id)
+    return list(batches.values())
+
+
+def check_targets(nodes: list, max_result_age: float = 0, max_workers: int = None, deadline: float = None) -> list:
+    """ Status of every node, each unique target is checked once and its result is shared by subscribers """
+    targets = {}
+    for node in nodes:
+        target = subscribe_node(node)
+        targets.setdefault(target.id, (target, node))
+
+    target_statuses = {}
+    stale = []
+    for target, node in targets.values():
+        if target_is_fresh(target, max_result_age):
+            target_statuses[target.id] = (target.last_status, target.last_status_text, target.last_reward_value)
+        else:
+            stale.append((target, node))
+
+    statuses = run_health_checks([get_node_checker(node)[0] for _, node in stale], max_workers, deadline)
+    checked = timezone.now()
+    for (target, _), status in zip(stale, statuses):
+        target_statuses[target.id] = status
+        target.last_checked = checked
+        target.last_status = status[0]
+        target.last_status_text = status[1]
+        try:
+            target.last_reward_value = float(status[2]) if len(status) > 2 else 0
+        except Exception:
+            target.last_reward_value = 0
+    CheckTarget.objects.bulk_update([target for target, _ in stale], TARGET_STATUS_FIELDS)
+    # Subscribers share one target instance and see the time its result was taken
+    for node in nodes:
+        node.target = targets[node.target.id][0]
+    return [target_statuses[node.target.id] for node in nodes]
+
 
-def check_nodes_now(user_id, send_changes=False):
+def batch_health_check(checkers: list) -> list:
+    """ Check co-located nodes together: inventory snapshot first, then one ssh round trip for direct cmds """
+    results = [checker.http_check() for checker in checkers]
+
+    units = {unit for checker in checkers for unit in checker.inventory_units}
+    if units or any(checker.inventory_containers for checker in checkers):
+        try:
+            inventory = get_host_inventory(checkers[0].ssh, units)
+        except Exception:
+            inventory = None
+        for i, checker in enumerate(checkers):
+            try:
+                answer = checker.inventory_answer(inventory) if inventory and results[i] is None else None
+            except Exception:
+                # Unexpected snapshot format, the checker runs own cmds
+                answer = None
+            if answer is not None:
+                results[i] = checker.parse_answer(answer)
+
+    direct = [i for i, checker in enumerate(checkers) if results[i] is None and checker.use_direct_exec()]
+    if len(direct) > 1:
+        connector = checkers[direct[0]].ssh
+        connector.max_command_wait = sum(checkers[i].ssh.max_command_wait for i in direct)
+        connector.max_answer_bytes = sum(checkers[i].ssh.max_answer_bytes for i in direct)
+        try:
+            answers = connector.exec_batch_direct([checkers[i].direct_cmd() for i in direct])
+            for i, answer in zip(direct, answers):
+                results[i] = checkers[i].parse_answer(answer)
+        except Exception as e:
+            for i in direct:
+                checkers[i].transport_failed = not isinstance(e, paramiko.AuthenticationException)
+                results[i] = (False, f'Wrong ssh answer {str(e)[:MAX_ERROR_LEN]}')
+
+    for i, checker in enumerate(checkers):
+        if results[i] is None:
+            results[i] = checker.health_check()
+    return results
+
+
+def run_health_checks(checkers: list, max_workers: int = None, deadline: float = None) -> list:
+    """ Check all nodes concurrently in one event loop, results keep checkers order
+
+    Blocking checks run on a pool of max_workers threads, checks not finished after deadline seconds are down.
+    """
+    results = [None] * len(checkers)
+    # Time every task started running in its thread, tasks still queued at the deadline have no entry
+    started_at = {}
+
+    async def timed(task_id, executor, func, *args):
+        def run():
+            started_at[task_id] = monotonic()
+            return func(*args)
+
+        task_results = await asyncio.get_running_loop().run_in_executor(executor, run)
+        return task_results, monotonic() - started_at[task_id]
+
+    async def run_batch(indexes, semaphore, executor):
+        # Paramiko is blocking, bridge it to the event loop through the executor threads
+        async with semaphore:
+            return await timed(tuple(indexes), executor, batch_health_check, [checkers[i] for i in indexes])
+
+    async def run_api_check(index, semaphore, host_semaphore, executor):
+        # Pooled requests session is blocking too, bounded globally and per node host
+        async with semaphore, host_semaphore:
+            result, latency = await timed((index,), executor, checkers[index].health_check)
+            return [result], latency
+
+    async def run_checks():
+        started = asyncio.get_running_loop().time()
+        # Wrong address of one node, like an api node without port, is down on its own
+        checker_targets = []
+        health_keys = []
+        for i, checker in enumerate(checkers):
+            try:
+                checker_targets.append(checker.probe_target())
+                health_keys.append(checker.health_key())
+            except ValueError as e:
+                checker_targets.append(None)
+                health_keys.append(None)
+                results[i] = (False, f'Wrong node address {str(e)[:MAX_ERROR_LEN]}')
+        # Open circuits skip even the tcp probe, after the backoff one probe and check pass through
+        circuit_open = {}
+        for key in set(health_keys) - {None}:
+            reason = target_health.allow(key)
+            if reason is not None:
+                circuit_open[key] = reason
+        checked_keys = set(health_keys) - {None} - circuit_open.keys()
+        # Unreachable targets are down right away, only reachable ones get the full check
+        unreachable = await probe_targets(
+            {target for target, key in zip(checker_targets, health_keys) if key in checked_keys},
+            settings.TCP_PROBE_TIMEOUT)
+        failed_keys = {key for target, key in zip(checker_targets, health_keys)
+                       if key in checked_keys and target in unreachable}
+        latencies = {}
+        timeouts = {}
+
+        ssh_batches = {}
+        api_indexes = []
+        for i, checker in enumerate(checkers):
+            target = checker_targets[i]
+            key = health_keys[i]
+            if target is None:
+                continue
+            if key in circuit_open:
+                results[i] = (False, circuit_open[key])
+            elif target in unreachable:
+                results[i] = (False, unreachable[target])
+            else:
+                timeouts[key] = target_health.timeout(key, checker.default_timeout())
+                checker.apply_timeout(timeouts[key])
+                if isinstance(checker, BaseNodeCheckerSSH):
+                    ssh_batches.setdefault(checker.batch_key() or i, []).append(i)
+                else:
+                    api_indexes.append(i)
+
+        ssh_semaphore = asyncio.Semaphore(settings.SSH_CHECKS_CONCURRENCY)
+        api_semaphore = asyncio.Semaphore(settings.HTTP_CHECKS_CONCURRENCY)
+        host_semaphores = {}
+        for i in api_indexes:
+            host_semaphores.setdefault(checker_targets[i][0],
+                                       asyncio.Semaphore(settings.HTTP_CHECKS_PER_HOST))
+
+        tasks_indexes = list(ssh_batches.values()) + [[i] for i in api_indexes]
+        if tasks_indexes:
+            executor = ThreadPoolExecutor(
+                max_workers=max_workers or settings.SSH_CHECKS_CONCURRENCY + settings.HTTP_CHECKS_CONCURRENCY)
+            tasks = [asyncio.ensure_future(run_batch(indexes, ssh_semaphore, executor))
+                     for indexes in ssh_batches.values()]
+            tasks += [asyncio.ensure_future(
+                run_api_check(i, api_semaphore, host_semaphores[checker_targets[i][0]], executor))
+                for i in api_indexes]
+            timeout = None if deadline is None else max(deadline - (asyncio.get_running_loop().time() - started), 0)
+            _, pending = await asyncio.wait(tasks, timeout=timeout)
+            for task in pending:
+                task.cancel()
+            # Checks past the deadline are left to finish in their threads, nobody waits for them
+            executor.shutdown(wait=not pending, cancel_futures=bool(pending))
+
+            for indexes, task in zip(tasks_indexes, tasks):
+                if task in pending:
+                    key = health_keys[indexes[0]]
+                    started = started_at.get(tuple(indexes))
+                    if started is None:
+                        # Never started, the target itself gave no outcome
+                        for i in indexes:
+                            results[i] = (False, f'Check not started before the {deadline:g} seconds deadline')
+                        continue
+                    latency = monotonic() - started
+                    if latency >= timeouts[key]:
+                        # Hung check counts as a failed probe, an open circuit must not stay half-open forever
+                        failed_keys.add(key)
+                        latencies[key] = max(latency, latencies.get(key, 0))
+                    for i in indexes:
+                        results[i] = (False, f'Check timed out after {deadline:g} seconds')
+                    continue
+                try:
+                    task_results, latency = task.result()
+                except Exception as e:
+                    # Failed batch is down on its own, other tasks keep their results
+                    for i in indexes:
+                        results[i] = (False, f'Wrong check {str(e)[:MAX_ERROR_LEN]}')
+                    continue
+                for i, result in zip(indexes, task_results):
+                    results[i] = result
+                key = health_keys[indexes[0]]
+                if any(checkers[i].transport_failed for i in indexes):
+                    failed_keys.add(key)
+                    if latency >= timeouts[key]:
+                        # Timed out check is a latency sample too, otherwise the timeout could only shrink
+                        latencies[key] = max(latency, latencies.get(key, 0))
+                else:
+                    latencies[key] = max(latency, latencies.get(key, 0))
+
+        # One outcome per target and cycle, however many nodes and tasks it has
+        for key in checked_keys:
+            if key in failed_keys:
+                target_health.record_failure(key, latencies.get(key))
+            elif key in latencies:
+                target_health.record_success(key, latencies[key])
+            else:
+                target_health.release(key)
+
+    if checkers:
+        asyncio.run(run_checks())
+    return results
+
+
+def get_type_intervals() -> dict:
+    return dict(NodeTypeSchedule.objects.values_list('node_type', 'check_interval'))
+
+
+def node_check_interval(node, type_intervals: dict) -> int:
+    """ Seconds to the next check: short while status changes or is not alerted yet, longer while healthy """
+    interval = node.check_interval or type_intervals.get(node.node_type) or settings.CHECK_INTERVAL
+    if node.same_status_count == 0 or node.notified_status != node.last_status:
+        return min(interval, settings.CHECK_INTERVAL_MIN)
+    if not node.last_status:
+        return interval
+    backoff = 2 ** min(node.same_status_count // settings.CHECK_BACKOFF_CHECKS, MAX_BACKOFF_POWER)
+    return min(interval * backoff, max(interval, settings.CHECK_INTERVAL_MAX))
+
+
+def node_check_slot(node) -> float:
+    """ Stable position of the node inside its check interval, from 0 to 1 """
+    return int(hashlib.sha256(str(node.id).encode()).hexdigest()[:8], 16) / 0x100000000
+
+
+def node_next_check_at(node, checked: datetime, interval: int) -> datetime:
+    """ Next own time slot of the node at least half an interval away, plus a small jitter
+
+    Slots spread checks of the same interval evenly over the window instead of one burst.
+    """
+    slot = node_check_slot(node) * interval
+    intervals = (checked.timestamp() + interval / 2 - slot) // interval + 1
+    next_check = slot + intervals * interval + random.uniform(-settings.CHECK_JITTER, settings.CHECK_JITTER)
+    return checked + timedelta(seconds=next_check - checked.timestamp())
+
+
+def check_nodes_now(user_id, send_changes=False, max_result_age=0, node_ids=None):
     nodes_status = ''
     nodes_status_changed = ''
     node_rewards = {}
-    user_nodes = Node.objects.filter(user_id=user_id).order_by('-created')
-
-    for index, node in enumerate(user_nodes):
-        # Get node type checker
-        node_context = NODE_TYPES.get(node.node_type)
-        if node_context['checker'] == CHECKER_API_CLASS:
-            checker = node_context['class'](node.node_ip, node.node_port)
-            node_description = f'{node.node_ip}:{node.node_port}'
-        else:
-            checker = node_context['class'](
-                node.node_ip, node.ssh_username, node.ssh_password, node.screen_name, node.sudo_flag)
-            node_description = f'{node.node_ip}@{node.ssh_username}'
-
-        # Check node status
-        node_status_full = checker.health_check()
+    user_nodes = list(Node.objects.filter(user_id=user_id).select_related('target').order_by('-created'))
+    # Scheduled checks take only planned nodes, numbers stay the same as in the nodes list
+    checked_nodes = [(index, node) for index, node in enumerate(user_nodes) if node_ids is None or node.id in node_ids]
+
+    # Check every shared target once, results younger than max_result_age are reused
+    node_statuses = check_targets([node for _, node in checked_nodes], max_result_age,
+                                  settings.CHECK_NOW_WORKERS, settings.CHECK_NOW_DEADLINE)
+    checked = timezone.now()
+    type_intervals = get_type_intervals()
+    node_histories = []
+
+    for (index, node), node_status_full in zip(checked_nodes, node_statuses):
+        node_description = get_node_checker(node)[1]
         status = node_status_full[0]
         status_text = node_status_full[1]
         try:
@@ -670,23 +1140,27 @@ def check_nodes_now(user_id, send_changes=False):
             node.notified_status = status
             nodes_status_changed += f'{index+1}. {node.node_type} {node_description} ({status} {(node.same_status_count + 1)} times, {status_text})\n'
 
-        # Save node history status
-        node_history = CheckHistory(
-            node=node, status=status, status_text=status_text, reward_value=reward_value)
-        node_history.save()
-
-        # Save node satus
-        node.last_checked = node_history.checked
+        # Collect node history status and node status, saved together below
+        node_histories.append(CheckHistory(
+            node=node, checked=checked, status=status, status_text=status_text, reward_value=reward_value))
+        node.last_checked = checked
         node.last_status = status
         node.last_status_text = status_text
         node.last_reward_value = reward_value
-        node.save()
+        # Slots count from the check itself, a late or reused result must not push the next check further away
+        node.next_check_at = node_next_check_at(
+            node, node.target.last_checked or checked, node_check_interval(node, type_intervals))
 
         # Collect all rewards
         if node.node_type not in node_rewards:
             node_rewards[node.node_type] = 0
         node_rewards[node.node_type] += node.last_reward_value
 
+    # One insert for history and one update of status columns only for all nodes
+    with transaction.atomic():
+        CheckHistory.objects.bulk_create(node_histories)
+        Node.objects.bulk_update([node for _, node in checked_nodes], NODE_STATUS_FIELDS)
+
     if send_changes and nodes_status_changed:
         _send_message(user_id=user_id,
                       text=f'Nodes status changed!\n{nodes_status_changed}')
@@ -741,6 +1215,8 @@ def list_nodes(user_id):
             nodes_status += f', with user {node.ssh_username}'
         if node.screen_name:
             nodes_status += f', with screen {node.screen_name}'
+        if node.ssh_key_path:
+            nodes_status += ', with key'
         if node.sudo_flag:
             nodes_status += ', with sudo'
         nodes_status += '\n'
@@ -748,16 +1224,11 @@ def list_nodes(user_id):
     return nodes_status or 'No node exists'
 
 
-def is_valid_ip(ip):
-    m = re.match(r"^(\d{1,3})\.(\d{1,3})\.(\d{1,3})\.(\d{1,3})$", ip)
-    return bool(m) and all(map(lambda n: 0 <= int(n) <= 255, m.groups()))
-
-
 def create_user_node(user_id, node_type, node_ip, node_port=None,
                      ssh_username=None, ssh_password=None, screen_name=None, sudo_flag=False):
 
-    if not is_valid_ip(node_ip):
-        return f'Wrong node_ip, not valid: {node_ip}'
+    if not is_valid_address(node_ip):
+        return f'Wrong node_ip, not valid ip or hostname: {node_ip}'
     if node_type not in NODE_TYPES.keys():
         return f'Wrong node_type, supported: {NODE_TYPES.keys()}'
     if node_port is not None and (not node_port.isdigit() or int(node_port) < 0 or int(node_port) > 65535):
@@ -794,5 +1265,6 @@ def delete_user_node(user_id, node_number):
         if str(index + 1) == node_number:
             deleted_node = f'{node.node_type} {node.node_ip} {node.node_port}'
             node.delete()
+            CheckTarget.objects.filter(id=node.target_id, nodes=None).delete()
 
     return f'Done. {deleted_node}'
@@ -0,0 +1,46 @@
+"""
+    Streaming parser of the prometheus text exposition format.
+
+    Reads only up to the last wanted metric family, series of one family come in one block,
+    so a family is complete as soon as another family starts.
+"""
+import re
+from typing import Iterable
+
+LABEL = re.compile(r'(\w+)="((?:[^"\\]|\\.)*)"')
+
+
+def metric_name(line: str) -> str:
+    return line.split('{', 1)[0].split(' ', 1)[0]
+
+
+def parse_sample(line: str) -> tuple[dict, float]:
+    """ Labels and value of one sample line, timestamp is ignored """
+    labels = {}
+    if '{' in line:
+        start, end = line.index('{'), line.rindex('}')
+        labels = dict(LABEL.findall(line[start + 1:end]))
+        value = line[end + 1:].split()[0]
+    else:
+        value = line.split()[1]
+    return labels, float(value)
+
+
+def scrape_metrics(lines: Iterable[str], families: Iterable[str]) -> dict:
+    """ Samples of wanted families as {family: [(labels, value)]}, stops once all of them are read """
+    wanted = set(families)
+    found = {}
+    current = None
+    for line in lines:
+        if not line or line[0] == '#':
+            continue
+        name = metric_name(line)
+        if name != current:
+            if current in found:
+                wanted.discard(current)
+                if not wanted:
+                    break
+            current = name
+        if name in wanted:
+            found.setdefault(name, []).append(parse_sample(line))
+    return found
@@ -0,0 +1,18 @@
+# Generated by Django 3.2.13 on 2026-10-17 12:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('nodes', '0011_node_notified_status'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='node',
+            name='ssh_key_path',
+            field=models.CharField(blank=True, max_length=1024, null=True),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 3.2.13 on 2026-10-17 12:00
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('nodes', '0012_node_ssh_key_path'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CheckTarget',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=64, unique=True)),
+                ('node_type', models.CharField(max_length=256)),
+                ('node_ip', models.CharField(max_length=256)),
+                ('last_checked', models.DateTimeField(blank=True, null=True)),
+                ('last_status', models.BooleanField(default=False)),
+                ('last_status_text', models.CharField(blank=True, max_length=2048, null=True)),
+                ('last_reward_value', models.FloatField(default=0)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='node',
+            name='target',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='nodes', to='nodes.checktarget'),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 3.2.13 on 2026-10-17 12:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('nodes', '0013_checktarget'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NodeTypeSchedule',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('node_type', models.CharField(max_length=256, unique=True)),
+                ('check_interval', models.IntegerField()),
+            ],
+        ),
+        migrations.AddField(
+            model_name='node',
+            name='check_interval',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='node',
+            name='next_check_at',
+            field=models.DateTimeField(blank=True, db_index=True, null=True),
+        ),
+    ]
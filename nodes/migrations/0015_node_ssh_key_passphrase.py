@@ -0,0 +1,18 @@
+# Generated by Django 3.2.13 on 2026-10-17 12:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('nodes', '0014_check_schedule'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='node',
+            name='ssh_key_passphrase',
+            field=models.CharField(blank=True, max_length=256, null=True),
+        ),
+    ]
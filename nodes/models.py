@@ -3,6 +3,17 @@ from django.db import models
 from tgbot.models import User
 
 
+class CheckTarget(models.Model):
+    """ Unique checked endpoint, nodes of all users with the same endpoint and credentials share its result """
+    key = models.CharField(max_length=64, unique=True)
+    node_type = models.CharField(max_length=256)
+    node_ip = models.CharField(max_length=256)
+    last_checked = models.DateTimeField(null=True, blank=True)
+    last_status = models.BooleanField(default=False)
+    last_status_text = models.CharField(null=True, blank=True, max_length=2048)
+    last_reward_value = models.FloatField(default=0)
+
+
 class Node(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     node_type = models.CharField(max_length=256)
@@ -10,8 +21,13 @@ class Node(models.Model):
     node_port = models.CharField(max_length=256, null=True, blank=True)
     ssh_username = models.CharField(max_length=256, null=True, blank=True)
     ssh_password = models.CharField(max_length=256, null=True, blank=True)
+    ssh_key_path = models.CharField(max_length=1024, null=True, blank=True)
+    ssh_key_passphrase = models.CharField(max_length=256, null=True, blank=True)
     screen_name = models.CharField(max_length=256, null=True, blank=True)
     sudo_flag = models.BooleanField(default=False)
+    check_interval = models.IntegerField(null=True, blank=True)  # seconds, node type interval if empty
+    next_check_at = models.DateTimeField(null=True, blank=True, db_index=True)
+    target = models.ForeignKey(CheckTarget, null=True, blank=True, on_delete=models.SET_NULL, related_name='nodes')
     created = models.DateTimeField(auto_now_add=True)
     last_checked = models.DateTimeField(null=True, blank=True)
     last_status = models.BooleanField(default=False)
@@ -21,6 +37,12 @@ class Node(models.Model):
     notified_status = models.BooleanField(default=False)
 
 
+class NodeTypeSchedule(models.Model):
+    """ Base check interval of all nodes of the type, CHECK_INTERVAL for types without a row """
+    node_type = models.CharField(max_length=256, unique=True)
+    check_interval = models.IntegerField()  # seconds
+
+
 class CheckHistory(models.Model):
     node = models.ForeignKey(Node, on_delete=models.CASCADE)
     checked = models.DateTimeField(auto_now_add=True)
@@ -0,0 +1,37 @@
+"""
+    Cheap concurrent TCP reachability probe, run before the expensive ssh and http checks.
+"""
+import asyncio
+import socket
+
+from nodes.dns_cache import dns_cache
+
+UNREACHABLE_STATUS_TEXT = 'Node is unreachable'
+
+
+async def probe_target(host: str, port: int, timeout: float, address: str) -> str:
+    """ Error text if TCP connect fails, None if the target accepts connections """
+    try:
+        _, writer = await asyncio.wait_for(asyncio.open_connection(address, port), timeout)
+    except asyncio.TimeoutError:
+        return f'{UNREACHABLE_STATUS_TEXT}, tcp connect to {host}:{port} timed out after {timeout} seconds'
+    except OSError as e:
+        return f'{UNREACHABLE_STATUS_TEXT}, tcp connect to {host}:{port} failed: {e}'
+    writer.close()
+    return None
+
+
+async def probe_targets(targets: set, timeout: float) -> dict:
+    """ Probe all (host, port) targets at once, returns errors of unreachable ones """
+    targets = list(targets)
+    # Blocking resolver runs in threads, answers stay cached for the following ssh and http checks
+    addresses = await asyncio.get_running_loop().run_in_executor(
+        None, dns_cache.resolve_many, {host for host, _ in targets})
+
+    async def probe(host, port):
+        if isinstance(addresses[host], socket.gaierror):
+            return f'{UNREACHABLE_STATUS_TEXT}, can not resolve {host}: {addresses[host]}'
+        return await probe_target(host, port, timeout, addresses[host][0])
+
+    errors = await asyncio.gather(*[probe(host, port) for host, port in targets])
+    return {target: error for target, error in zip(targets, errors) if error}
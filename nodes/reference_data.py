@@ -0,0 +1,156 @@
+"""
+    Reference data cache for explorer block heights and wallet balances.
+
+    Values are kept in redis with a TTL so every worker shares them, concurrent misses
+    for the same key collapse into a single upstream request. Chain heights are hedged
+    across several configured sources, the first valid answer wins.
+"""
+import json
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from threading import Lock
+from time import monotonic, sleep
+
+import redis
+from django.conf import settings
+
+from nodes.http_logic import http_get
+
+CACHE_KEY_PREFIX = 'nodes:reference:'
+LOCK_KEY_PREFIX = 'nodes:reference:lock:'
+LOCK_WAIT_POLL = 0.1
+HEIGHT_KEY_PREFIX = 'height:'
+
+redis_client = None
+local_cache = {}
+key_locks = {}
+locks_lock = Lock()
+
+
+def get_redis() -> redis.Redis:
+    global redis_client
+    if redis_client is None:
+        redis_client = redis.Redis.from_url(settings.REDIS_URL, socket_timeout=1, socket_connect_timeout=1)
+    return redis_client
+
+
+def get_cached(key: str):
+    expires, value = local_cache.get(key, (0, None))
+    if expires > monotonic():
+        return value
+    try:
+        value = get_redis().get(CACHE_KEY_PREFIX + key)
+    except redis.RedisError:
+        return None
+    if value is None:
+        return None
+    value = json.loads(value)
+    local_cache[key] = (monotonic() + settings.REFERENCE_DATA_LOCAL_TTL, value)
+    return value
+
+
+def set_cached(key: str, value, ttl: int) -> None:
+    local_cache[key] = (monotonic() + min(ttl, settings.REFERENCE_DATA_LOCAL_TTL), value)
+    try:
+        get_redis().set(CACHE_KEY_PREFIX + key, json.dumps(value), ex=ttl)
+    except redis.RedisError:
+        pass
+
+
+def acquire_fetch_lock(key: str) -> bool:
+    """ True if this worker should fetch key, waits for the worker holding the lock otherwise """
+    lock_key = LOCK_KEY_PREFIX + key
+    try:
+        if get_redis().set(lock_key, 1, nx=True, px=int(settings.HTTP_READ_TIMEOUT * 1000)):
+            return True
+    except redis.RedisError:
+        return True
+
+    deadline = monotonic() + settings.HTTP_READ_TIMEOUT
+    while monotonic() < deadline:
+        sleep(LOCK_WAIT_POLL)
+        if get_cached(key) is not None:
+            return False
+        try:
+            if not get_redis().exists(lock_key):
+                return get_cached(key) is None
+        except redis.RedisError:
+            return True
+    return True
+
+
+def release_fetch_lock(key: str) -> None:
+    try:
+        get_redis().delete(LOCK_KEY_PREFIX + key)
+    except redis.RedisError:
+        pass
+
+
+def get_reference(key: str, fetch, default=None, ttl: int = None):
+    """ Cached result of fetch(), default if it cannot be fetched, failures are not cached """
+    value = get_cached(key)
+    if value is not None:
+        return value
+
+    with locks_lock:
+        key_lock = key_locks.setdefault(key, Lock())
+    with key_lock:
+        value = get_cached(key)
+        if value is not None:
+            return value
+        if not acquire_fetch_lock(key):
+            value = get_cached(key)
+            return default if value is None else value
+        try:
+            value = fetch()
+            set_cached(key, value, ttl or settings.REFERENCE_DATA_TTL)
+        except Exception:
+            value = default
+        finally:
+            release_fetch_lock(key)
+        return value
+
+
+def get_reference_json(url: str, ttl: int = None) -> dict:
+    """ Cached json answer of url, empty dict if it cannot be fetched """
+    return get_reference(url, lambda: http_get(url).json(), {}, ttl)
+
+
+def parse_source_height(url: str, answer: dict) -> int:
+    # Tendermint RPC /status or explorers.guru blocks list
+    if url.rstrip('/').endswith('/status'):
+        return int(answer['result']['sync_info']['latest_block_height'])
+    return int(answer['data'][0]['height'])
+
+
+def fetch_source_height(url: str) -> int:
+    return parse_source_height(url, http_get(url, timeout=(settings.HTTP_CONNECT_TIMEOUT,
+                                                           settings.REFERENCE_SOURCE_TIMEOUT)).json())
+
+
+def fetch_hedged_height(sources: list) -> int:
+    """ Ask sources one by one, next one joins after the hedge delay or a failure, first valid wins """
+    executor = ThreadPoolExecutor(max_workers=len(sources))
+    try:
+        pending = set()
+        next_sources = iter(sources)
+        while True:
+            source = next(next_sources, None)
+            if source is not None:
+                pending.add(executor.submit(fetch_source_height, source))
+            if not pending:
+                raise ValueError(f'No valid height from {sources}')
+            done, pending = wait(pending, timeout=settings.REFERENCE_HEDGE_DELAY if source else None,
+                                 return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    return future.result()
+    finally:
+        executor.shutdown(wait=False)
+
+
+def get_chain_height(chain: str) -> int:
+    """ Cached reference height of the chain, None if no source answers """
+    sources = settings.CHAIN_HEIGHT_SOURCES.get(chain, [])
+    if not sources:
+        return None
+    return get_reference(HEIGHT_KEY_PREFIX + chain, lambda: fetch_hedged_height(sources))
@@ -1,57 +1,341 @@
+import codecs
+import hashlib
+import os
 from datetime import datetime, timedelta
+from typing import Iterable, Iterator
 import paramiko
 import re
-from time import sleep
+from itertools import chain
+from threading import Lock
+from time import monotonic, sleep
+from uuid import uuid4
 
+from nodes.dns_cache import dns_cache
 
+
+SSH_PORT = 22
+LOCALHOST = '127.0.0.1'
 MAX_COMMAND_WAIT = 10
-AFTER_COMMAND_WAIT = 1
 CHANNEL_TIMEOUT = 20
+POLL_INTERVAL = 0.05
+RECV_CHUNK_SIZE = 32768
+PROMPT_TAIL_SIZE = 256
+PROMPT_QUIET_PERIOD = 2
+SENTINEL_PREFIX = '__NODE_CHECK_DONE'
+MAX_ANSWER_BYTES = 1024 * 1024
+
+ANSI_ESCAPE = re.compile(r'(?:\x1B[@-_]|[\x80-\x9F])[0-?]*[ -/]*[@-~]')
+MULTIPLE_SPACES = re.compile(r'  +')
+PROMPT_END = re.compile(r'[#$>:%] ?$')
+
+POOL_MAX_SIZE = 256
+POOL_IDLE_TIMEOUT = 15 * 60
+POOL_KEEPALIVE_INTERVAL = 30
+
+
+class SSHTransportPool():
+    """ Per-process pool of authenticated ssh clients keyed by (host, username, credentials fingerprint) """
+
+    def __init__(self, max_size=POOL_MAX_SIZE, idle_timeout=POOL_IDLE_TIMEOUT,
+                 keepalive_interval=POOL_KEEPALIVE_INTERVAL) -> None:
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.keepalive_interval = keepalive_interval
+        self.clients = {}
+        self.last_used = {}
+        self.key_locks = {}
+        self.lock = Lock()
+
+    @staticmethod
+    def is_healthy(client: paramiko.SSHClient) -> bool:
+        transport = client.get_transport()
+        return transport is not None and transport.is_active() and transport.is_authenticated()
+
+    @staticmethod
+    def pool_key(host: str, username: str, password: str, pkey: paramiko.PKey = None) -> tuple:
+        # Credentials are part of the key, a transport is never shared with a check that could not authenticate
+        fingerprint = 'password:' + hashlib.sha256((password or '').encode()).hexdigest()
+        if pkey is not None:
+            fingerprint += ',key:' + pkey.get_fingerprint().hex()
+        return (host, username, fingerprint)
+
+    def get_transport(self, host: str, username: str, password: str, pkey: paramiko.PKey = None) -> paramiko.Transport:
+        key = self.pool_key(host, username, password, pkey)
+        with self.lock:
+            self.evict_idle()
+            key_lock = self.key_locks.setdefault(key, Lock())
+
+        # Transport is shared by concurrent checks of the same host, connect only once
+        with key_lock:
+            client = self.clients.get(key)
+            if client is not None and not self.is_healthy(client):
+                self.discard(key)
+                client = None
+            if client is None:
+                client = self.connect(host, username, password, pkey)
+                client.get_transport().set_keepalive(self.keepalive_interval)
+
+            with self.lock:
+                self.clients[key] = client
+                self.last_used[key] = monotonic()
+                self.evict_oldest()
+        return client.get_transport()
+
+    @staticmethod
+    def connect(host: str, username: str, password: str, pkey: paramiko.PKey = None) -> paramiko.SSHClient:
+        """ Connect through cached host addresses, next address is tried if one does not answer """
+        addresses = dns_cache.resolve(host)
+        for address in addresses:
+            client = paramiko.SSHClient()
+            client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+            try:
+                client.connect(address, username=username, password=password, pkey=pkey,
+                               look_for_keys=False, allow_agent=False)
+                return client
+            except (OSError, paramiko.SSHException) as e:
+                client.close()
+                if isinstance(e, paramiko.AuthenticationException) or address == addresses[-1]:
+                    raise
+
+    def drop(self, key: tuple) -> paramiko.SSHClient:
+        """ Forget the client of key, called under the pool lock """
+        self.last_used.pop(key, None)
+        key_lock = self.key_locks.get(key)
+        if key_lock is not None and not key_lock.locked():
+            # Lock in use means a check is connecting this key right now and keeps the lock
+            self.key_locks.pop(key)
+        return self.clients.pop(key, None)
+
+    def discard(self, key: tuple) -> None:
+        with self.lock:
+            client = self.drop(key)
+        if client is not None:
+            client.close()
+
+    def evict_idle(self) -> None:
+        now = monotonic()
+        for key, used in list(self.last_used.items()):
+            if now - used > self.idle_timeout:
+                self.drop(key).close()
+
+    def evict_oldest(self) -> None:
+        while len(self.clients) > self.max_size:
+            self.drop(min(self.last_used, key=self.last_used.get)).close()
+
+    def close_all(self) -> None:
+        with self.lock:
+            for client in self.clients.values():
+                client.close()
+            self.clients.clear()
+            self.last_used.clear()
+            self.key_locks.clear()
+
+
+ssh_pool = SSHTransportPool()
+
+PKEY_CLASSES = (paramiko.Ed25519Key, paramiko.ECDSAKey, paramiko.RSAKey)
+pkey_cache = {}
+pkey_lock = Lock()
+
+
+def load_private_key(path: str, passphrase: str = None) -> paramiko.PKey:
+    """ Parse and decrypt private key once per process, reload only when the key file changes """
+    key = (path, os.path.getmtime(path))
+    with pkey_lock:
+        pkey = pkey_cache.get(key)
+    if pkey is not None:
+        return pkey
+
+    for pkey_class in PKEY_CLASSES:
+        try:
+            pkey = pkey_class.from_private_key_file(path, password=passphrase)
+            break
+        except paramiko.PasswordRequiredException:
+            raise
+        except paramiko.SSHException:
+            continue
+    else:
+        raise paramiko.SSHException(f'Not supported private key {path}')
+
+    with pkey_lock:
+        pkey_cache[key] = pkey
+    return pkey
+
+
+class TerminalTokenizer():
+    """ Incremental terminal output tokenizer, strips ANSI escapes, splits CR/LF and collapses spaces """
+
+    def __init__(self, collapse_spaces=True) -> None:
+        self.collapse_spaces = collapse_spaces
+        self.decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+        self.pending = ''
+
+    def feed(self, chunk: bytes) -> Iterator[str]:
+        # Escapes never span a line break, so everything up to the last break is complete
+        text = self.pending + self.decoder.decode(chunk)
+        end = max(text.rfind('\n'), text.rfind('\r')) + 1
+        self.pending = text[end:]
+        return self.tokenize(text[:end])
+
+    def close(self) -> Iterator[str]:
+        text = self.pending + self.decoder.decode(b'', final=True)
+        self.pending = ''
+        return self.tokenize(text)
+
+    def tokenize_chunks(self, chunks: Iterable[bytes]) -> Iterator[str]:
+        for chunk in chunks:
+            yield from self.feed(chunk)
+        yield from self.close()
+
+    def tokenize(self, text: str) -> Iterator[str]:
+        # Whole regex passes run in C, far cheaper than a per character python loop
+        text = ANSI_ESCAPE.sub('', text)
+        if self.collapse_spaces and '  ' in text:
+            text = MULTIPLE_SPACES.sub(' ', text)
+        return filter(None, text.splitlines())
+
+
+class AnswerBuffer():
+    """ Ring buffer of channel output, keeps only the last max_bytes, positions count all received bytes """
+
+    def __init__(self, max_bytes=MAX_ANSWER_BYTES) -> None:
+        self.max_bytes = max_bytes
+        self.data = bytearray()
+        self.dropped = 0
+
+    def __len__(self) -> int:
+        return self.dropped + len(self.data)
+
+    def append(self, chunk: bytes) -> None:
+        self.data += chunk
+        overflow = len(self.data) - self.max_bytes
+        if overflow > 0:
+            del self.data[:overflow]
+            self.dropped += overflow
+
+    def since(self, position: int) -> bytes:
+        return bytes(self.data[max(position - self.dropped, 0):])
+
+    def lines(self, until: str = None) -> Iterator[str]:
+        """ Yield tokenized non empty lines, stop before the line containing until """
+        data = memoryview(self.data)
+        if self.dropped:
+            # First line was cut by the ring buffer
+            data = data[self.data.find(b'\n') + 1:]
+        for line in TerminalTokenizer().tokenize_chunks(data[i:i + RECV_CHUNK_SIZE]
+                                                        for i in range(0, len(data), RECV_CHUNK_SIZE)):
+            if until and until in line:
+                return
+            yield line
 
 
 class SSHConnector():
-    client = None
     channel = None
+    exit_status = None
     first_cmd_flag = False
     sudo_flag = False
     screen_flag = False
 
     def __init__(self, host, username, password, max_command_wait=MAX_COMMAND_WAIT, \
-            after_command_wait=AFTER_COMMAND_WAIT, channel_timeout=CHANNEL_TIMEOUT) -> None:
+            channel_timeout=CHANNEL_TIMEOUT, max_answer_bytes=MAX_ANSWER_BYTES, key_path=None,
+            key_passphrase=None) -> None:
         self.username = username
         self.password = password
+        self.key_path = key_path
+        self.key_passphrase = key_passphrase
         self.host = host
         self.max_command_wait = max_command_wait
-        self.after_command_wait = after_command_wait
+        self.max_answer_bytes = max_answer_bytes
+        self.answer = AnswerBuffer(max_answer_bytes)
+        self.cmd_start = 0
         self.channel_timeout = channel_timeout
-        self.client = paramiko.SSHClient()
-        self.client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+
+    def credentials(self) -> tuple:
+        """ Login password and private key, paramiko tries the key first and the password after it """
+        if not self.key_path:
+            return self.password, None
+        try:
+            return self.password, load_private_key(self.key_path, self.key_passphrase)
+        except (OSError, paramiko.SSHException):
+            if not self.password:
+                raise
+            # Unreadable key, password auth still works
+            return self.password, None
+
+    def pool_key(self) -> tuple:
+        return ssh_pool.pool_key(self.host, self.username, *self.credentials())
+
+    def get_transport(self) -> paramiko.Transport:
+        return ssh_pool.get_transport(self.host, self.username, *self.credentials())
+
+    def open_channel(self) -> None:
+        transport = self.get_transport()
+        try:
+            self.channel = transport.open_session()
+        except paramiko.SSHException:
+            if transport.is_active():
+                # Channel refused on a live shared transport (MaxSessions), other checks keep using it
+                raise
+            # Pooled transport died between validation and use, reconnect once
+            ssh_pool.discard(self.pool_key())
+            self.channel = self.get_transport().open_session()
+        self.channel.settimeout(self.channel_timeout)
 
     def connect(self) -> None:
-        self.client.connect(self.host, username=self.username, password=self.password)
-        self.channel = self.client.get_transport().open_session()
+        self.open_channel()
         self.channel.get_pty()
-        self.channel.settimeout(self.channel_timeout)
 
-    def send_command(self, cmd: str) -> None:
+    def send_command(self, cmd: str, sentinel: str = None, prompt: bool = True) -> None:
+        if sentinel:
+            sentinel_cmd = f"printf '%s_%s\\n' {SENTINEL_PREFIX} {sentinel}"
+            cmd = f'{cmd}; {sentinel_cmd}' if cmd else sentinel_cmd
+        self.cmd_start = len(self.answer)
         if not self.first_cmd_flag:
             self.first_cmd_flag = True
             self.connect()
             self.channel.exec_command(cmd)
-            self.wait_ready(cmd)
         else:
             self.channel.send(cmd + '\n')
-            self.wait_ready(cmd)
+        self.wait_ready(cmd, sentinel, prompt)
 
-    def wait_ready(self, cmd: str) -> None:
-        sleep(3)
-        dt_start = datetime.now()
-        while not self.channel.recv_ready():
-            dt_now = datetime.now()
-            if dt_start + timedelta(seconds=self.max_command_wait) < dt_now:
+    def wait_ready(self, cmd: str, sentinel: str = None, prompt: bool = True) -> None:
+        """ Read channel until sentinel, exit status or shell prompt, max_command_wait is the only bound
+
+        Intermediate steps also finish after a quiet period, their prompt may be one is_prompt does not know.
+        """
+        sentinel_line = f'{SENTINEL_PREFIX}_{sentinel}'.encode() if sentinel else None
+        dt_start = last_recv = datetime.now()
+        while True:
+            if self.channel.recv_ready():
+                self.answer.append(self.channel.recv(RECV_CHUNK_SIZE))
+                last_recv = datetime.now()
+                if sentinel_line and sentinel_line in self.answer.since(self.cmd_start):
+                    return
+                continue
+            if self.channel.exit_status_ready():
+                self.read_to_eof(self.answer, self.channel.recv)
+                return
+            if prompt and not sentinel_line and (
+                    self.is_prompt(self.answer.since(self.cmd_start)) or
+                    last_recv + timedelta(seconds=PROMPT_QUIET_PERIOD) < datetime.now()):
+                return
+            if dt_start + timedelta(seconds=self.max_command_wait) < datetime.now():
                 raise TimeoutError(f'Cannot execute command {cmd}, after {self.max_command_wait} seconds')
-            sleep(1)
-        sleep(self.after_command_wait)
+            sleep(POLL_INTERVAL)
+
+    @staticmethod
+    def read_to_eof(buffer: AnswerBuffer, recv) -> None:
+        # sshd may send exit-status before the last output packets, only EOF ends the stream
+        while True:
+            chunk = recv(RECV_CHUNK_SIZE)
+            if not chunk:
+                return
+            buffer.append(chunk)
+
+    @staticmethod
+    def is_prompt(answer: bytes) -> bool:
+        tail = ANSI_ESCAPE.sub('', answer[-PROMPT_TAIL_SIZE:].decode(errors='ignore'))
+        return bool(PROMPT_END.search(tail))
 
     def enter_sudo(self) -> None:
         if self.sudo_flag:
@@ -66,28 +350,100 @@ class SSHConnector():
         self.send_command(f'screen -dr {screen}')
         self.screen_flag = True
 
-    def exec_commands(self, cmds: list[str], screen: bool = False, sudo: bool = False) -> str:
+    def exec_commands(self, cmds: list[str], screen: bool = False, sudo: bool = False,
+                      interactive: bool = False) -> str:
         if sudo:
             self.enter_sudo()
         if screen:
             self.enter_screen(screen)
 
-        for cmd in cmds:
-            self.send_command(cmd)
-        return self.parse_answer(self.channel.recv(9999).decode())
+        # Only a finished command in a real shell can echo the sentinel, interactive
+        # consoles in between are driven by their prompts and direct commands by exit status
+        sentinel = uuid4().hex if self.sudo_flag or self.screen_flag else None
+        for index, cmd in enumerate(cmds):
+            # Last command of an interactive console is typed into the console, not the shell
+            shell_last_cmd = index == len(cmds) - 1 and not (interactive and sentinel)
+            self.send_command(cmd, sentinel if shell_last_cmd else None, prompt=not shell_last_cmd)
+        if interactive and sentinel:
+            # Last command leaves the console, the sentinel goes to the shell as own command
+            self.send_command('', sentinel, prompt=False)
 
-    @staticmethod
-    def parse_answer(answer: str) -> list[str]:
-        ansi_escape = re.compile(r'(?:\x1B[@-_]|[\x80-\x9F])[0-?]*[ -/]*[@-~]')
-        answer_parsed = ansi_escape.sub('', answer)
+        until = f'{SENTINEL_PREFIX}_{sentinel}' if sentinel else None
+        return self.parse_answer(self.answer.lines(until))
 
-        answer_lines = []
-        for l in answer_parsed.split('\n'):
-            answer_lines += l.split('\r')
-        return list(filter(lambda x: x, answer_lines))
+    def read_direct(self, cmd: str) -> tuple[AnswerBuffer, AnswerBuffer]:
+        self.open_channel()
+        self.channel.exec_command(cmd)
+        stdout, stderr = AnswerBuffer(self.max_answer_bytes), AnswerBuffer(self.max_answer_bytes)
+        dt_start = datetime.now()
+        while True:
+            if self.channel.recv_ready():
+                stdout.append(self.channel.recv(RECV_CHUNK_SIZE))
+            elif self.channel.recv_stderr_ready():
+                stderr.append(self.channel.recv_stderr(RECV_CHUNK_SIZE))
+            elif self.channel.exit_status_ready():
+                break
+            elif dt_start + timedelta(seconds=self.max_command_wait) < datetime.now():
+                raise TimeoutError(f'Cannot execute command {cmd}, after {self.max_command_wait} seconds')
+            else:
+                sleep(POLL_INTERVAL)
+        self.read_to_eof(stdout, self.channel.recv)
+        self.read_to_eof(stderr, self.channel.recv_stderr)
+        self.exit_status = self.channel.recv_exit_status()
+        return stdout, stderr
+
+    def exec_command_direct(self, cmd: str) -> list[str]:
+        """ Run one command without pty and shell, stdout lines go before stderr lines """
+        stdout, stderr = self.read_direct(cmd)
+        return list(chain(stdout.lines(), stderr.lines()))
+
+    def exec_batch_direct(self, cmds: list[str]) -> list[list[str]]:
+        """ Run several commands in one exec channel, each in own subshell, answer lines split per command """
+        delimiter = f'{SENTINEL_PREFIX}_{uuid4().hex}'
+        # Delimiter starts a new line even if the command output does not end with one, empty lines are skipped
+        script = ''.join(f"( {cmd} ) 2>&1; printf '\\n%s\\n' {delimiter}; " for cmd in cmds)
+        stdout, _ = self.read_direct(script)
+
+        answers = [[]]
+        for line in stdout.lines():
+            if line == delimiter:
+                answers.append([])
+            else:
+                answers[-1].append(line)
+        if len(answers) <= len(cmds):
+            raise ValueError(f'Batch answer has {len(answers) - 1} of {len(cmds)} commands')
+        return answers[:len(cmds)]
+
+    def forward_http_post(self, port: int, path: str, body: bytes) -> bytes:
+        """ Plain http post to a remote localhost port through a direct-tcpip channel of the pooled transport """
+        channel = self.get_transport().open_channel(
+            'direct-tcpip', (LOCALHOST, port), (LOCALHOST, 0), timeout=self.channel_timeout)
+        channel.settimeout(self.channel_timeout)
+        response = AnswerBuffer(self.max_answer_bytes)
+        try:
+            channel.sendall(
+                f'POST {path} HTTP/1.0\r\nHost: {LOCALHOST}:{port}\r\nContent-Type: application/json\r\n'
+                f'Content-Length: {len(body)}\r\nConnection: close\r\n\r\n'.encode() + body)
+            while True:
+                chunk = channel.recv(RECV_CHUNK_SIZE)
+                if not chunk:
+                    break
+                response.append(chunk)
+        finally:
+            channel.close()
+
+        head, _, content = response.since(0).partition(b'\r\n\r\n')
+        status = int(head.split(b' ', 2)[1])
+        if status >= 300:
+            raise ValueError(f'Wrong forwarded http answer code {status}')
+        return content
+
+    @staticmethod
+    def parse_answer(answer: Iterable[str]) -> list[str]:
+        # Lines come from TerminalTokenizer, already free of escapes, CR/LF and empty lines
+        return list(answer)
 
     def __del__(self) -> None:
+        # Transport stays in ssh_pool for the next check, only the channel is ours
         if self.channel:
             self.channel.close()
-        if self.client:
-            self.client.close()
@@ -2,32 +2,80 @@
     Celery node tasks.
 """
 import json
+from datetime import timedelta
 
 from dtb.celery import app
+from celery import chord, group
 from celery.utils.log import get_task_logger
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
 
-from nodes.logic import check_nodes_now, check_nodes_cached
+from nodes.logic import check_nodes_now, check_nodes_cached, check_targets, plan_target_batches
+from nodes.models import Node
 from nodes.nodesguru import check_nodes_guru_updates
 from tgbot.models import User
 from tgbot.handlers.broadcast_message.utils import _send_message
 
 logger = get_task_logger(__name__)
 
+PLANNER_TICK = 60  # beat runs the planner every minute
+
 
 @app.task(ignore_result=True)
 def check_nodes_task() -> None:
-    """ It's used to check all nodes status """
-    logger.info(f"Going to check all nodes status")
+    """ It's used to plan nodes due till the next tick, host batches are sent to the checks queue in node slots """
+    now = timezone.now()
+    tick_end = now + timedelta(seconds=PLANNER_TICK)
+    nodes = list(Node.objects.filter(Q(next_check_at__isnull=True) | Q(next_check_at__lt=tick_end))
+                 .select_related('target'))
+    due = {node.id: max(node.next_check_at or now, now) for node in nodes}
+    # Planned nodes are leased until results are applied, next ticks do not plan them again
+    Node.objects.filter(id__in=[node.id for node in nodes]).update(
+        next_check_at=now + timedelta(seconds=settings.CHECK_RESULT_MAX_AGE))
+    batches = plan_target_batches(nodes, settings.TARGET_RESULT_TTL)
+    users_nodes = {}
+    for node in nodes:
+        users_nodes.setdefault(node.user_id, []).append(node.id)
+    logger.info(f"Going to check {len(nodes)} due nodes, "
+                f"{sum(map(len, batches))} targets in {len(batches)} host batches")
+
+    callback = send_check_results_task.si(list(users_nodes.items()))
+    if batches:
+        # Every batch waits for its earliest node slot, checks are submitted evenly over the tick
+        chord([check_targets_task.s(node_ids).set(
+            countdown=(min(due[node_id] for node_id in node_ids) - now).total_seconds())
+            for node_ids in batches])(callback)
+    else:
+        callback.delay()
 
-    for user in User.objects.all():
-        try:
-            logger.info(f'Checking for {user.user_id}')
-            check_nodes_now(user.user_id, send_changes=True)
-            logger.info(f"All nodes for user {user.user_id} checked")
-        except Exception as e:
-            logger.error(f"Failed to check nodes, reason: {e}")
 
-    logger.info("All nodes check finished!")
+@app.task
+def check_targets_task(node_ids: list) -> int:
+    """ It's used to check targets of one host, results are stored on the shared targets """
+    try:
+        check_targets(list(Node.objects.filter(id__in=node_ids).select_related('target')))
+    except Exception as e:
+        logger.error(f"Failed to check nodes {node_ids}, reason: {e}")
+    return len(node_ids)
+
+
+@app.task(ignore_result=True)
+def send_check_results_task(users_nodes: list) -> None:
+    """ It's used to fan checked targets out to users, one task per user """
+    group([apply_check_results_task.si(user_id, node_ids) for user_id, node_ids in users_nodes]).delay()
+    logger.info(f"All nodes check finished, sending results to {len(users_nodes)} users")
+
+
+@app.task(ignore_result=True)
+def apply_check_results_task(user_id: int, node_ids: list) -> None:
+    """ It's used to save checked user nodes statuses and send one notification of changes """
+    try:
+        check_nodes_now(user_id, send_changes=True, max_result_age=settings.CHECK_RESULT_MAX_AGE,
+                        node_ids=set(node_ids))
+        logger.info(f"All nodes for user {user_id} checked")
+    except Exception as e:
+        logger.error(f"Failed to check nodes, reason: {e}")
 
 
 @app.task(ignore_result=True)